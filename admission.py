@@ -0,0 +1,163 @@
+import asyncio
+import itertools
+import time
+from collections import Counter, deque
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from metrics import metrics
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    #caps how many searches run at once, overall, per guild and per user; the rest wait in one
+    #bounded queue that hands out free slots fairly between guilds instead of first come first served
+    def __init__(self, max_active: int = 8, per_guild: int = 3, per_user: int = 1, max_queued: int = 50,
+                 per_user_queued: int = 1, guild_weights: Dict[int, float] = None):
+        self.max_active = max_active
+        self.per_guild = per_guild
+        self.per_user = per_user
+        self.max_queued = max_queued
+        self.per_user_queued = per_user_queued
+        #guilds with a higher weight get a proportionally larger share when everyone is waiting
+        self.guild_weights = guild_weights or {}
+
+        self._active = 0
+        self._active_by_guild = Counter()
+        self._active_by_user = Counter()
+        self._queued_by_user = Counter()
+
+        #guild -> FIFO of [tag, seq, user_id, future]; tags implement start-time fair queuing
+        self._queues = {}
+        self._guild_tags = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+        self.admitted = 0
+        self.rejected = 0
+
+        metrics.register_gauges('admission', self.stats)
+
+    def _weight(self, guild_id: int) -> float:
+        return self.guild_weights.get(guild_id, 1.0)
+
+    async def acquire(self, user_id: int, guild_id: Optional[int],
+                      on_queued: Callable[[int], Awaitable] = None) -> Tuple[int, int]:
+        #returns the ticket to pass to release(), or raises AdmissionRejected when overloaded
+        guild_id = guild_id or 0
+        pending = self._active_by_user[user_id] + self._queued_by_user[user_id]
+        if pending >= self.per_user + self.per_user_queued:
+            self._reject('user')
+            raise AdmissionRejected("You already have a search running, wait for it to finish.")
+        if self.queued() >= self.max_queued:
+            self._reject('queue_full')
+            raise AdmissionRejected("The bot is very busy right now, please try again in a minute.")
+
+        #a guild's next request is tagged 1/weight after its previous one, but never behind the present
+        tag = max(self._virtual_time, self._guild_tags.get(guild_id, 0.0)) + 1 / self._weight(guild_id)
+        self._guild_tags[guild_id] = tag
+        future = asyncio.get_running_loop().create_future()
+        entry = [tag, next(self._seq), user_id, future]
+        self._queues.setdefault(guild_id, deque()).append(entry)
+        self._queued_by_user[user_id] += 1
+        self._dispatch()
+
+        if not future.done():
+            enqueued_at = time.monotonic()
+            metrics.inc('admission_queued')
+            try:
+                if on_queued is not None:
+                    await on_queued(self.position(entry))
+                await future
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    #admitted just as the caller gave up, hand the slot straight back
+                    self.release((guild_id, user_id))
+                else:
+                    future.cancel()
+                    self._remove(guild_id, entry)
+                raise
+            metrics.observe('admission_wait', time.monotonic() - enqueued_at)
+        return guild_id, user_id
+
+    def release(self, ticket: Tuple[int, int]):
+        guild_id, user_id = ticket
+        self._active -= 1
+        self._active_by_guild[guild_id] -= 1
+        self._active_by_user[user_id] -= 1
+        if not self._active_by_guild[guild_id]:
+            del self._active_by_guild[guild_id]
+        if not self._active_by_user[user_id]:
+            del self._active_by_user[user_id]
+        self._dispatch()
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        metrics.inc('admission_rejected', reason=reason)
+
+    def _remove(self, guild_id: int, entry: list):
+        queue = self._queues.get(guild_id)
+        if queue is not None and entry in queue:
+            queue.remove(entry)
+            self._dequeued(guild_id, entry)
+        self._dispatch()
+
+    def _dequeued(self, guild_id: int, entry: list):
+        self._queued_by_user[entry[2]] -= 1
+        if not self._queued_by_user[entry[2]]:
+            del self._queued_by_user[entry[2]]
+        if not self._queues[guild_id]:
+            del self._queues[guild_id]
+
+    def _next_entry(self, guild_id: int) -> Optional[list]:
+        #oldest request of the guild whose user isn't already at their cap
+        if self._active_by_guild[guild_id] >= self.per_guild:
+            return None
+        for entry in self._queues[guild_id]:
+            if self._active_by_user[entry[2]] < self.per_user:
+                return entry
+        return None
+
+    def _dispatch(self):
+        while self._active < self.max_active:
+            best = None
+            for guild_id in self._queues:
+                entry = self._next_entry(guild_id)
+                if entry is not None and (best is None or entry[:2] < best[1][:2]):
+                    best = guild_id, entry
+            if best is None:
+                break
+
+            guild_id, entry = best
+            self._queues[guild_id].remove(entry)
+            self._dequeued(guild_id, entry)
+            self._virtual_time = max(self._virtual_time, entry[0])
+
+            user_id, future = entry[2], entry[3]
+            self._active += 1
+            self._active_by_guild[guild_id] += 1
+            self._active_by_user[user_id] += 1
+            self.admitted += 1
+            future.set_result(None)
+
+        #tags of guilds with nothing queued are only kept while they are still ahead of the clock
+        if len(self._guild_tags) > len(self._queues) + self.max_active:
+            self._guild_tags = {guild_id: tag for guild_id, tag in self._guild_tags.items()
+                                if tag > self._virtual_time or guild_id in self._queues}
+
+    def position(self, entry: list) -> int:
+        #estimated place in line: requests that would be served first under fair scheduling
+        return 1 + sum(1 for queue in self._queues.values() for other in queue if other[:2] < entry[:2])
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'active': self._active,
+            'queued': self.queued(),
+            'guilds_waiting': len(self._queues),
+            'admitted': self.admitted,
+            'rejected': self.rejected
+        }
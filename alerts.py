@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import time
+from collections import defaultdict
+from typing import Dict, List
+import discord
+from commands import JobQuery, parse_job_command
+from metrics import metrics
+from models import Job
+from ratelimit import PRIORITY_BACKGROUND
+
+white = 0xffffff
+
+#every alert checks this many of the newest postings
+ALERT_RESULT_LIMIT = 10
+
+
+def alert_key(job_query: JobQuery) -> str:
+    #subscriptions that would send the same upstream search share one key
+    query = ' '.join(sorted(job_query.query.lower().split()))
+    location = '' if job_query.remote_only else ' '.join(job_query.location.lower().split())
+    parts = [query, location, str(job_query.remote_only), str(job_query.min_salary or ''), job_query.date_posted]
+
+    #the extra filters run locally, but results that differ must not share seen-sets
+    spec = job_query.filters
+    extra = [str(spec.max_salary or ''), ','.join(sorted(spec.employment_types)),
+             ','.join(sorted(spec.exclude_keywords)), ','.join(sorted(spec.exclude_employers)),
+             str(spec.max_age_days or '')]
+    if any(extra):
+        parts.extend(extra)
+    return '|'.join(parts)
+
+
+def job_hash(job: Job) -> int:
+    #signed 64-bit so it fits an SQLite INTEGER
+    key = job.job_id or f"{job.job_title.lower()}|{job.employer_name.lower()}"
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class AlertScheduler:
+    def __init__(self, bot, db, job_scraper, interval: float = 900, concurrency: int = 2):
+        self.bot = bot
+        self.db = db
+        self.job_scraper = job_scraper
+        self.interval = interval
+        self.concurrency = concurrency
+        self._task = None
+
+        self.polls = 0
+        self.upstream_searches = 0
+        self.notifications = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Alert poll failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def _owns(self, alert: Dict) -> bool:
+        #each shard process polls only the alerts of its own guilds, so no search or
+        #notification is repeated across processes; direct message alerts go to shard 0
+        shard_ids = getattr(self.bot, 'shard_ids', None)
+        shard_count = getattr(self.bot, 'shard_count', None)
+        if not shard_ids or not shard_count:
+            return True
+        guild_id = int(alert['guild_id']) if alert['guild_id'] else 0
+        return (guild_id >> 22) % shard_count in shard_ids
+
+    async def run_once(self):
+        self.polls += 1
+        alerts = [alert for alert in await self.db.get_all_alerts() if self._owns(alert)]
+
+        groups = defaultdict(list)
+        for alert in alerts:
+            groups[alert['query_key']].append(alert)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def poll(group: List[Dict]):
+            async with semaphore:
+                await self._poll_group(group)
+
+        with metrics.span('alert_poll'):
+            await asyncio.gather(*(poll(group) for group in groups.values()))
+
+    async def _poll_group(self, group: List[Dict]):
+        #one upstream search serves every subscriber of the same query
+        job_query = parse_job_command(group[0]['raw_query'])
+        try:
+            jobs = await self.job_scraper.search_jobs(
+                job_query.query, job_query.location, ALERT_RESULT_LIMIT, job_query.remote_only,
+                job_query.min_salary, job_query.date_posted, priority=PRIORITY_BACKGROUND, allow_local=False,
+                filters=job_query.filters
+            )
+        except Exception as e:
+            print(f"Alert search failed for '{group[0]['raw_query']}': {e}")
+            return
+        self.upstream_searches += 1
+        metrics.inc('alert_searches')
+
+        hashed = {job_hash(job): job for job in jobs}
+        alert_ids = [alert['id'] for alert in group]
+        unseen = await self.db.get_unseen_jobs(alert_ids, list(hashed))
+
+        seen = []
+        by_channel = defaultdict(lambda: ([], {}))
+        for alert in group:
+            new_hashes = unseen.get(alert['id'], set())
+            #every posting still in the results is refreshed, so only ones gone for a month get pruned
+            seen.extend((alert['id'], value) for value in hashed)
+
+            #a fresh subscription only records the current results as its baseline
+            if alert['last_checked'] is None or not new_hashes:
+                continue
+
+            mentions, channel_jobs = by_channel[alert['channel_id']]
+            mentions.append(alert['user_id'])
+            for value in new_hashes:
+                channel_jobs[value] = hashed[value]
+
+        await self.db.mark_alerts_seen(seen, alert_ids)
+
+        for channel_id, (mentions, channel_jobs) in by_channel.items():
+            await self._notify(int(channel_id), group[0]['raw_query'], mentions, list(channel_jobs.values()))
+
+    async def _notify(self, channel_id: int, raw_query: str, user_ids: List[str], jobs: List[Job]):
+        channel = self.bot.get_channel(channel_id)
+        if channel is None:
+            return
+
+        embed = discord.Embed(
+            title=f"New jobs for `{raw_query}`"[:256],
+            colour=white
+        )
+        for job in jobs[:ALERT_RESULT_LIMIT]:
+            details = job.job_city or 'Remote'
+            if job.job_apply_link:
+                details += f" - [Apply]({job.job_apply_link})"
+            embed.add_field(name=f"{job.job_title} at {job.employer_name}"[:256], value=details[:1024], inline=False)
+        embed.set_footer(text="Manage alerts with .alert list / .alert remove <id>")
+
+        mentions = ' '.join(f"<@{user_id}>" for user_id in dict.fromkeys(user_ids))
+        try:
+            await channel.send(content=mentions, embed=embed)
+            self.notifications += 1
+            metrics.inc('alert_notifications')
+        except discord.HTTPException as e:
+            print(f"Alert notification failed for channel {channel_id}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'polls': self.polls,
+            'upstream_searches': self.upstream_searches,
+            'notifications': self.notifications
+        }
+
+
+def setup_alert_commands(bot, db, colors, max_alerts_per_user: int = 5):
+    red, white, green = colors
+
+    @bot.command(name='alert')
+    async def alert_command(ctx, *, args: str = ""):
+        user_id = ctx.author.id
+        action = args.split()[0].lower() if args.split() else ""
+
+        if action == "list":
+            alerts = await db.get_user_alerts(user_id)
+            if not alerts:
+                await ctx.send("You have no job alerts. Create one with `.alert python developer --remote`")
+                return
+            embed = discord.Embed(title="Your Job Alerts", colour=white)
+            for alert in alerts:
+                embed.add_field(name=f"#{alert['id']}", value=f"`{alert['raw_query']}` in <#{alert['channel_id']}>",
+                                inline=False)
+            await ctx.send(embed=embed)
+
+        elif action == "remove":
+            target = args.split()[1] if len(args.split()) > 1 else ""
+            if target.lower() == "all":
+                count = await db.remove_alerts(user_id)
+            elif target.lstrip('#').isdigit():
+                count = await db.remove_alerts(user_id, int(target.lstrip('#')))
+            else:
+                await ctx.send("Usage: `.alert remove <id>` or `.alert remove all`")
+                return
+            await ctx.send(f"Removed {count} job alert{'s' if count != 1 else ''}")
+
+        elif args.strip():
+            job_query = parse_job_command(args)
+            if not job_query.query.strip():
+                await ctx.send(embed=discord.Embed(
+                    title="Invalid Alert",
+                    description="Please provide a job title or keywords",
+                    colour=red
+                ))
+                return
+
+            if len(await db.get_user_alerts(user_id)) >= max_alerts_per_user:
+                await ctx.send(f"You can have at most {max_alerts_per_user} alerts. Remove one with `.alert remove <id>`")
+                return
+
+            guild_id = ctx.guild.id if ctx.guild else None
+            alert_id = await db.add_alert(user_id, guild_id, ctx.channel.id, args.strip(), alert_key(job_query))
+            await ctx.send(embed=discord.Embed(
+                title="Job Alert Created",
+                description=f"**#{alert_id}** `{args.strip()}`\nNew postings will be announced in this channel.",
+                colour=green
+            ))
+
+        else:
+            await ctx.send(embed=discord.Embed(
+                title="Job Alerts",
+                description="**Usage:**\n`.alert python developer --remote` - Get notified about new postings\n"
+                            "`.alert list` - Show your alerts\n"
+                            "`.alert remove <id>` - Remove an alert\n"
+                            "`.alert remove all` - Remove every alert",
+                colour=white
+            ))
@@ -0,0 +1,86 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedupe import DEFAULT_THRESHOLD, NearDuplicateDetector
+from models import Job
+from fake_jsearch import make_job
+
+SUFFIXES = ['', ' - Remote', ' (Hybrid)', ' | Apply Now', ' - Full Time', ' II']
+
+
+def syndicate(job: Job, rng: random.Random) -> Job:
+    #the same posting as another board would list it
+    words = job.job_description.split()
+    if rng.random() < 0.5:
+        words = words[:len(words) - rng.randint(1, 20)]
+    for _ in range(rng.randint(0, 3)):
+        words[rng.randrange(min(len(words), 120))] = rng.choice(['our', 'great', 'team', 'role'])
+    return Job(
+        job_id=f"{job.job_id}-{rng.randint(0, 9999)}",
+        job_title=f"  {job.job_title}{rng.choice(SUFFIXES)} ".replace(' ', rng.choice([' ', '  '])),
+        employer_name=rng.choice([job.employer_name, job.employer_name.upper(), job.employer_name + ' Inc.']),
+        job_description='  '.join(words) if rng.random() < 0.5 else ' '.join(words),
+        job_city=job.job_city,
+        job_apply_link=job.job_apply_link
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Near-duplicate detection throughput and accuracy")
+    parser.add_argument('--jobs', type=int, default=10000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.3)
+    parser.add_argument('--threshold', type=int, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--description-words', type=int, default=400)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    originals = args.jobs - int(args.jobs * args.duplicate_rate)
+    jobs, origin = [], []
+    for i in range(originals):
+        jobs.append(Job.from_dict(make_job(f"query{i % 50}", i // 10, i, args.description_words)))
+        origin.append(i)
+    while len(jobs) < args.jobs:
+        source = rng.randrange(originals)
+        jobs.append(syndicate(jobs[source], rng))
+        origin.append(source)
+
+    order = list(range(len(jobs)))
+    rng.shuffle(order)
+    jobs = [jobs[i] for i in order]
+    origin = [origin[i] for i in order]
+
+    detector = NearDuplicateDetector(args.threshold)
+    started = time.perf_counter()
+    kept = [detector.add_job(job) for job in jobs]
+    elapsed = time.perf_counter() - started
+
+    #a job is a true duplicate if an earlier job in the stream came from the same original
+    seen_origins = set()
+    true_positive = false_positive = false_negative = 0
+    for is_new, source in zip(kept, origin):
+        duplicate = source in seen_origins
+        seen_origins.add(source)
+        if duplicate and not is_new:
+            true_positive += 1
+        elif not duplicate and not is_new:
+            false_positive += 1
+        elif duplicate and is_new:
+            false_negative += 1
+
+    print(f"jobs={len(jobs)} threshold={args.threshold} elapsed={elapsed:.2f}s "
+          f"({len(jobs) / elapsed:.0f} jobs/s, {elapsed / len(jobs) * 1e6:.0f}us/job, "
+          f"{detector.comparisons / len(jobs):.1f} comparisons/job)")
+    print(f"dropped={kept.count(False)} true_dup={true_positive} false_dup={false_positive} missed={false_negative}")
+    precision = true_positive / max(true_positive + false_positive, 1)
+    recall = true_positive / max(true_positive + false_negative, 1)
+    print(f"precision={precision:.3f} recall={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import hashlib
+import random
+from typing import Dict, List
+from aiohttp import web
+
+TITLES = ['Software Engineer', 'Python Developer', 'Data Analyst', 'Backend Engineer',
+          'Frontend Developer', 'DevOps Engineer', 'Data Scientist', 'Product Manager',
+          'Machine Learning Engineer', 'QA Engineer', 'Site Reliability Engineer']
+EMPLOYERS = ['Acme Corp', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark Industries',
+             'Wayne Enterprises', 'Wonka Industries', 'Cyberdyne', 'Soylent']
+CITIES = ['London', 'New York', 'Berlin', 'Toronto', 'Austin', 'Sydney', 'Remote']
+TYPES = ['FULLTIME', 'PARTTIME', 'CONTRACTOR', 'INTERN']
+WORDS = ('we are looking for a motivated engineer to join our team you will build scalable '
+         'services work with product and design and ship features to millions of users '
+         'experience with python sql cloud platforms and testing is a plus').split()
+
+
+def make_job(query: str, page: int, index: int, description_words: int) -> Dict:
+    #seeded per query and position so repeated pages return identical payloads
+    seed = int(hashlib.md5(f"{query}|{page}|{index}".encode()).hexdigest()[:8], 16)
+    rng = random.Random(seed)
+    min_salary = rng.choice([None, rng.randrange(30000, 150000, 5000)])
+    city = rng.choice(CITIES)
+
+    return {
+        'job_id': f"{seed:08x}",
+        'job_title': f"{rng.choice(TITLES)}{' (Remote)' if city == 'Remote' else ''}",
+        'employer_name': rng.choice(EMPLOYERS),
+        'employer_logo': None,
+        'employer_website': 'https://example.com',
+        'job_publisher': rng.choice(['LinkedIn', 'Indeed', 'Glassdoor']),
+        'job_employment_type': rng.choice(TYPES),
+        'job_apply_link': f"https://example.com/jobs/{seed:08x}",
+        'job_description': ' '.join(rng.choice(WORDS) for _ in range(description_words)),
+        'job_is_remote': city == 'Remote',
+        'job_posted_at_datetime_utc': f"2024-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}T00:00:00.000Z",
+        'job_city': None if city == 'Remote' else city,
+        'job_country': 'US',
+        'job_min_salary': min_salary,
+        'job_max_salary': min_salary + 20000 if min_salary else None,
+        'job_salary_period': 'YEAR' if min_salary else None,
+        'job_highlights': {'Qualifications': [' '.join(rng.choice(WORDS) for _ in range(12)) for _ in range(5)]},
+        'job_required_skills': None
+    }
+
+
+class FakeJSearch:
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, page_size: int = 10, total_pages: int = 5,
+                 description_words: int = 400, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.page_size = page_size
+        self.total_pages = total_pages
+        self.description_words = description_words
+        self.rng = random.Random(seed)
+
+        self.requests = 0
+        self.status_counts = {}
+
+    def _record(self, status: int):
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    async def search(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+
+        roll = self.rng.random()
+        if roll < self.rate_limit_rate:
+            self._record(429)
+            return web.Response(status=429, headers={'Retry-After': '1'})
+        if roll < self.rate_limit_rate + self.error_rate:
+            self._record(500)
+            return web.Response(status=500)
+
+        query = request.query.get('query', '')
+        page = int(request.query.get('page', '1'))
+        jobs: List[Dict] = []
+        if page <= self.total_pages:
+            jobs = [make_job(query, page, i, self.description_words) for i in range(self.page_size)]
+
+        self._record(200)
+        return web.json_response({'status': 'OK', 'request_id': str(self.requests), 'data': jobs})
+
+    async def stats(self, _request: web.Request) -> web.Response:
+        return web.json_response({'requests': self.requests, 'status_counts': self.status_counts})
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/search', self.search)
+        app.router.add_get('/stats', self.stats)
+        return app
+
+
+async def start_server(fake: FakeJSearch, host: str = '127.0.0.1', port: int = 8787) -> web.AppRunner:
+    runner = web.AppRunner(fake.create_app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the JSearch /search endpoint")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--total-pages', type=int, default=5)
+    parser.add_argument('--description-words', type=int, default=400)
+    args = parser.parse_args()
+
+    fake = FakeJSearch(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                       args.page_size, args.total_pages, args.description_words)
+    print(f"Fake JSearch listening on http://{args.host}:{args.port}")
+    web.run_app(fake.create_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
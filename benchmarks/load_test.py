@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord
+from discord.ext import commands
+from commands import setup_commands
+from recent import RecentJobsStore
+from components import RapidAPIJobScraper
+from database import DatabaseManager
+from ratelimit import RequestScheduler
+from metrics import metrics
+from fake_jsearch import FakeJSearch, start_server
+
+QUERIES = ['python developer', 'data analyst', 'software engineer', 'devops', 'data scientist',
+           'frontend developer', 'backend engineer', 'product manager', 'qa engineer', 'sre']
+FLAGS = ['', '--location london', '--remote', '--salary 60000', '--limit 20', '--recent',
+         '--location berlin --limit 15', '--remote --salary 80000']
+
+
+class FakeUser:
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+
+
+class FakeMessage:
+    def __init__(self, ctx):
+        self.id = id(self)
+        self.ctx = ctx
+        self.embed = None
+        self.view = None
+
+    async def edit(self, embed=None, view=None, **_kwargs):
+        self.embed = embed
+        self.view = view
+        self.ctx.finished_at = time.perf_counter()
+        return self
+
+
+class FakeContext:
+    #just enough of commands.Context for the command callbacks
+    def __init__(self, bot, user_id: int, guild_id: int, channel_id: int):
+        self.bot = bot
+        self.author = FakeUser(user_id)
+        self.guild = FakeGuild(guild_id)
+        self.channel = FakeChannel(channel_id)
+        self.message = None
+        self.finished_at = None
+        self.sent = []
+
+    async def send(self, content=None, embed=None, view=None, **_kwargs):
+        message = FakeMessage(self)
+        message.embed = embed
+        message.view = view
+        self.sent.append(message)
+        self.finished_at = time.perf_counter()
+        return message
+
+    async def reply(self, content=None, **kwargs):
+        return await self.send(content, **kwargs)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    fake = FakeJSearch(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                       args.page_size, args.total_pages, args.description_words, args.seed)
+    runner = await start_server(fake, port=args.port)
+
+    tmp_dir = tempfile.mkdtemp(prefix='jobbot-bench-')
+    db = DatabaseManager(os.path.join(tmp_dir, 'bench.db'))
+    scraper = RapidAPIJobScraper(
+        'bench-key',
+        base_url=f"http://127.0.0.1:{args.port}",
+        scheduler=RequestScheduler(rate=args.api_rate, burst=args.api_burst)
+    )
+
+    bot = commands.Bot(command_prefix='.', intents=discord.Intents.default(), help_command=None)
+    setup_commands(bot, db, scraper, RecentJobsStore(db), (0xff0000, 0xffffff, 0x00ff00))
+    jobs_command = bot.get_command('jobs')
+
+    rng = random.Random(args.seed)
+    #a skewed query mix, a few searches are much more popular than the rest
+    weights = [1 / (rank + 1) for rank in range(len(QUERIES))]
+    latencies = []
+    failures = 0
+
+    async def user_session(user_index: int):
+        nonlocal failures
+        for _ in range(args.commands):
+            query = rng.choices(QUERIES, weights)[0]
+            search = f"{query} {rng.choice(FLAGS)}".strip()
+            ctx = FakeContext(bot, 1000 + user_index, user_index % args.guilds, user_index % (args.guilds * 2))
+
+            started = time.perf_counter()
+            await jobs_command.callback(ctx, search_query=search)
+            latencies.append((ctx.finished_at or time.perf_counter()) - started)
+
+            final = ctx.sent[-1] if ctx.sent else None
+            if final is None or final.embed is None or final.embed.title in ("Search Error",):
+                failures += 1
+            if args.think_ms:
+                await asyncio.sleep(rng.uniform(0, args.think_ms) / 1000)
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(user_session(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = len(latencies)
+    cache_stats = scraper.cache.stats()
+    print(f"users={args.users} commands/user={args.commands} total={total} failures={failures}")
+    print(f"elapsed={elapsed:.2f}s throughput={total / elapsed:.1f} cmd/s")
+    print("latency ms: p50={:.1f} p95={:.1f} p99={:.1f} max={:.1f}".format(
+        percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000,
+        percentile(latencies, 99) * 1000, max(latencies) * 1000 if latencies else 0))
+    print(f"api calls={fake.requests} per command={fake.requests / max(total, 1):.2f} statuses={fake.status_counts}")
+    print(f"cache={cache_stats} scheduler={scraper.scheduler.stats()}")
+    for stage, (p50, p99, count) in metrics.stage_summary().items():
+        print(f"stage {stage}: p50={p50 * 1000:.1f}ms p99={p99 * 1000:.1f}ms n={count}")
+    print(f"memory: traced peak={peak / 1024 / 1024:.1f}MiB "
+          f"max rss={resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}MiB")
+
+    await scraper.close()
+    await db.close()
+    await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the .jobs command against the fake JSearch server")
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--commands', type=int, default=5)
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--think-ms', type=float, default=0)
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency-ms', type=float, default=200)
+    parser.add_argument('--jitter-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=10)
+    parser.add_argument('--total-pages', type=int, default=5)
+    parser.add_argument('--description-words', type=int, default=400)
+    parser.add_argument('--api-rate', type=float, default=50)
+    parser.add_argument('--api-burst', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
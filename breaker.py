@@ -0,0 +1,127 @@
+import time
+from collections import deque
+from typing import Dict, Optional
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+#numeric states for the Prometheus gauge
+STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    #passive health model of the upstream API built from the outcome of real requests;
+    #while open, requests fail at once instead of each waiting out its own timeout
+    def __init__(self, window: int = 20, min_calls: int = 5, failure_threshold: float = 0.5,
+                 slow_call_seconds: float = 10.0, open_seconds: float = 30.0, max_open_seconds: float = 300.0,
+                 half_open_probes: int = 1):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        #responses slower than this count against health just like errors
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        #(healthy, seconds) for the most recent requests
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._open_for = open_seconds
+        self._probes = 0
+
+        self.opened = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_success_at = None
+
+    def allow(self) -> bool:
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self._open_for:
+                self.rejected += 1
+                return False
+            #cool-down over, let a few real requests through to test the upstream
+            self.state = HALF_OPEN
+            self._probes = 0
+
+        if self.state == HALF_OPEN:
+            if self._probes >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes += 1
+        return True
+
+    def check(self):
+        if not self.allow():
+            raise CircuitOpenError(f"Job search is temporarily unavailable, "
+                                   f"try again in {max(1, round(self.retry_in()))}s.")
+
+    def record(self, healthy: Optional[bool], seconds: float, error: str = None):
+        #healthy None means the call ended without an answer either way, e.g. it was cancelled
+        if self.state == HALF_OPEN:
+            self._probes = max(0, self._probes - 1)
+        if healthy is None:
+            return
+
+        healthy = healthy and seconds < self.slow_call_seconds
+        if healthy:
+            self.last_success_at = time.time()
+        else:
+            self.last_error = error or f"slow response ({seconds:.1f}s)"
+
+        if self.state == HALF_OPEN:
+            if healthy:
+                self.state = CLOSED
+                self._outcomes.clear()
+                self._open_for = self.open_seconds
+            else:
+                #each failed probe doubles the cool-down
+                self._trip(min(self.max_open_seconds, self._open_for * 2))
+            return
+
+        self._outcomes.append((healthy, seconds))
+        if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                and self.failure_rate() >= self.failure_threshold):
+            self._trip(self.open_seconds)
+
+    def _trip(self, open_for: float):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+        self._open_for = open_for
+        self._outcomes.clear()
+        self.opened += 1
+
+    def failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for healthy, _seconds in self._outcomes if not healthy) / len(self._outcomes)
+
+    def retry_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self._open_for - time.monotonic())
+
+    def latency(self, point: float = 0.5) -> float:
+        ordered = sorted(seconds for _healthy, seconds in self._outcomes)
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(point * len(ordered)))]
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            'state': self.state,
+            'state_code': STATE_CODES[self.state],
+            'calls': len(self._outcomes),
+            'failure_rate': round(self.failure_rate(), 3),
+            'p50_ms': round(self.latency(0.5) * 1000, 1),
+            'p99_ms': round(self.latency(0.99) * 1000, 1),
+            'retry_in_s': round(self.retry_in(), 1),
+            'opened': self.opened,
+            'rejected': self.rejected
+        }
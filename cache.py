@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+#seconds a cached page stays fresh, per date_posted value
+DEFAULT_TTLS = {
+    'today': 300,
+    '3days': 900,
+    'week': 1800,
+    'month': 3600,
+    'all': 3600
+}
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024,
+                 ttls: Dict[str, int] = None, default_ttl: int = 900, stale_ttl: float = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.default_ttl = default_ttl
+        #expired entries are kept this much longer as a fallback for when the source is down,
+        #they still count against the size limits and are evicted in LRU order
+        self.stale_ttl = stale_ttl
+
+        #key -> (expires_at, size, value), oldest first
+        self._entries = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+
+    def ttl_for(self, date_posted: str) -> int:
+        return self.ttls.get(date_posted, self.default_ttl)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, _size, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            if expires_at + self.stale_ttl <= now:
+                self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        #lookup without touching LRU order or counters
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[2]
+
+    def get_stale(self, key: Hashable) -> Optional[Any]:
+        #the value even if expired, as long as it is within the stale window
+        entry = self._entries.get(key)
+        if entry is None or entry[0] + self.stale_ttl <= time.monotonic():
+            return None
+        self.stale_hits += 1
+        return entry[2]
+
+    def set(self, key: Hashable, value: Any, size: int, ttl: float):
+        if key in self._entries:
+            self._remove(key)
+
+        #a single value bigger than the whole budget is never worth keeping
+        if size > self.max_bytes:
+            return
+
+        self._entries[key] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _expires_at, size, _value = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'stale_hits': self.stale_hits
+        }
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight = {}
+        self._waiters = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, factory):
+        #concurrent callers with the same key await one shared upstream task
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda t: self._finish(key, t))
+        else:
+            self.shared += 1
+
+        self._waiters[key] += 1
+        try:
+            #shield so one cancelled waiter doesn't cancel the request for the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            #the upstream call is only dropped once nobody is waiting for it, and forgotten right
+            #away so a caller arriving while it winds down starts a fresh one instead of joining it
+            if self._inflight.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0:
+                    del self._inflight[key]
+                    del self._waiters[key]
+                    task.cancel()
+            raise
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+            del self._waiters[key]
+        #mark the error as retrieved in case every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._inflight)
@@ -1,15 +1,85 @@
 import discord
+import math
 from datetime import datetime
-from components import JobNavigationView
-
-
-
-def parse_job_command(args: str) -> tuple:
+from typing import NamedTuple, Optional
+from metrics import metrics
+from components import JobNavigationView, NavigationButton, ResultStream, SavedJobsView
+from recent import recent_scope
+from export import EXPORT_FORMATS, export_bookmarks
+from filters import EMPLOYMENT_TYPES, FilterSpec
+from admission import AdmissionController, AdmissionRejected
+from breaker import CLOSED, HALF_OPEN
+
+
+
+#amounts above this are typos, and would not fit an SQLite integer for local searches anyway
+MAX_AMOUNT = 10 ** 9
+#--max-age beyond this is clamped, a cutoff too far back overflows the date arithmetic
+MAX_AGE_DAYS = 365
+
+
+class JobQuery(NamedTuple):
+    query: str
+    location: str
+    limit: int
+    remote_only: bool
+    min_salary: Optional[int]
+    date_posted: str
+    local_only: bool
+    filters: FilterSpec = FilterSpec()
+
+
+def _parse_amount(value: str) -> Optional[int]:
+    #accepts 70000, 70,000 and 70k
+    value = value.lower().replace(',', '').lstrip('$')
+    multiplier = 1000 if value.endswith('k') else 1
+    try:
+        amount = float(value.rstrip('k')) * multiplier
+    except ValueError:
+        return None
+    #inf, nan and absurd figures are ignored like any other unreadable amount
+    if not math.isfinite(amount) or not 0 <= amount <= MAX_AMOUNT:
+        return None
+    return int(amount)
+
+
+def _parse_list(value: str) -> set:
+    return {item.strip().lower() for item in value.split(',') if item.strip()}
+
+
+#shorthand locations users type, mapped to one spelling so their searches share a cache entry
+LOCATION_ALIASES = {
+    'nyc': 'new york',
+    'ny': 'new york',
+    'sf': 'san francisco',
+    'la': 'los angeles',
+    'dc': 'washington dc',
+    'ldn': 'london',
+    'uk': 'united kingdom',
+    'gb': 'united kingdom',
+    'us': 'united states',
+    'usa': 'united states',
+    'uae': 'united arab emirates'
+}
+
+
+def canonical_location(location: str) -> str:
+    location = ' '.join(location.lower().replace('_', ' ').split())
+    return LOCATION_ALIASES.get(location, location)
+
+
+def parse_job_command(args: str) -> JobQuery:
     location = ""
     limit = 10
     remote_only = False
     min_salary = None
     date_posted = "all"
+    local_only = False
+    max_salary = None
+    employment_types = set()
+    exclude_keywords = set()
+    exclude_employers = set()
+    max_age_days = None
 
     parts = args.split()
     i = 0
@@ -19,7 +89,7 @@ def parse_job_command(args: str) -> tuple:
         part = parts[i].lower()
 
         if part == "--location" and i + 1 < len(parts):
-            location = parts[i + 1]
+            location = canonical_location(parts[i + 1])
             i += 2
         elif part == "--limit" and i + 1 < len(parts):
             try:
@@ -28,8 +98,23 @@ def parse_job_command(args: str) -> tuple:
                 pass
             i += 2
         elif part == "--salary" and i + 1 < len(parts):
+            min_salary = _parse_amount(parts[i + 1]) or min_salary
+            i += 2
+        elif part == "--max-salary" and i + 1 < len(parts):
+            max_salary = _parse_amount(parts[i + 1]) or max_salary
+            i += 2
+        elif part == "--type" and i + 1 < len(parts):
+            employment_types.update(EMPLOYMENT_TYPES[t] for t in _parse_list(parts[i + 1]) if t in EMPLOYMENT_TYPES)
+            i += 2
+        elif part == "--exclude" and i + 1 < len(parts):
+            exclude_keywords.update(_parse_list(parts[i + 1]))
+            i += 2
+        elif part == "--exclude-employer" and i + 1 < len(parts):
+            exclude_employers.update(_parse_list(parts[i + 1]))
+            i += 2
+        elif part == "--max-age" and i + 1 < len(parts):
             try:
-                min_salary = int(parts[i + 1])
+                max_age_days = max(1, min(MAX_AGE_DAYS, int(parts[i + 1])))
             except ValueError:
                 pass
             i += 2
@@ -42,15 +127,24 @@ def parse_job_command(args: str) -> tuple:
         elif part == "--week":
             date_posted = "3days"
             i += 1
+        elif part == "--local":
+            local_only = True
+            i += 1
         else:
             query_parts.append(parts[i])
             i += 1
 
     query = " ".join(query_parts)
-    return query, location, limit, remote_only, min_salary, date_posted
+    filters = FilterSpec(remote_only, min_salary, max_salary, frozenset(employment_types),
+                         frozenset(exclude_keywords), frozenset(exclude_employers), max_age_days)
+    return JobQuery(query, location, limit, remote_only, min_salary, date_posted, local_only, filters)
 
-def setup_commands(bot, db, job_scraper, recent_jobs, colors):
+def setup_commands(bot, db, job_scraper, recent_jobs, colors, admission: AdmissionController = None):
     red, white, green = colors
+    admission = admission if admission is not None else AdmissionController()
+
+    #navigation buttons are answered from their custom_id, so they keep working across restarts
+    bot.add_dynamic_items(NavigationButton)
 
     @bot.command(name='jobs')
     async def search_jobs(ctx, *, search_query: str = ""):
@@ -63,7 +157,7 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
             await ctx.send(embed=embed)
             return
 
-        query, location, limit, remote_only, min_salary, date_posted = parse_job_command(search_query)
+        query, location, limit, remote_only, min_salary, date_posted, local_only, filters = parse_job_command(search_query)
 
         if not query.strip():
             embed = discord.Embed(
@@ -75,44 +169,84 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
             return
 
         user_id = ctx.author.id
+        metrics.inc('commands', command='jobs')
 
-        db.add_search_history(user_id, search_query)
-
-        embed = discord.Embed(
-            title="Searching for Jobs...",
-            description=f"**Query:** {query}\n**Location:** {location or 'Any'}\n**Limit:** {limit}",
-            colour=white
-        )
-        message = await ctx.send(embed=embed)
+        #past the concurrency caps searches wait their turn, past the queue limit they are turned away
+        message = None
 
-        try:
-            jobs = await job_scraper.search_jobs(
-                query, location, limit, remote_only, min_salary, date_posted
+        async def on_queued(position: int):
+            nonlocal message
+            embed = discord.Embed(
+                title="Busy, Search Queued",
+                description=f"**Query:** {query}\nQueued at position {position}, it will start automatically",
+                colour=white
             )
+            message = await ctx.send(embed=embed)
 
-            recent_jobs.extend(jobs[:5])
-            recent_jobs[:] = recent_jobs[-20:]
-
-            if not jobs:
-                embed = discord.Embed(
-                    title="No Jobs Found",
-                    description="Try different keywords or remove some filters",
-                    colour=red
-                )
-                await message.edit(embed=embed)
-                return
+        try:
+            ticket = await admission.acquire(user_id, ctx.guild.id if ctx.guild else None, on_queued)
+        except AdmissionRejected as e:
+            embed = discord.Embed(title="Too Busy", description=str(e), colour=red)
+            await ctx.send(embed=embed)
+            return
 
-            view = JobNavigationView(jobs, 0, user_id, db)
-            embed = view.create_embed()
-            await message.edit(embed=embed, view=view)
+        try:
+            #only searches that were let in count towards history, popular searches and prefetching
+            with metrics.span('db_history_write'):
+                await db.add_search_history(user_id, search_query)
 
-        except Exception as e:
             embed = discord.Embed(
-                title="Search Error",
-                description=f"**Error:** {str(e)}\n\nPlease try again later or contact an admin.",
-                colour=red
+                title="Searching for Jobs...",
+                description=f"**Query:** {query}\n**Location:** {location or 'Any'}\n**Limit:** {limit}",
+                colour=white
             )
-            await message.edit(embed=embed)
+            with metrics.span('discord_send'):
+                if message is None:
+                    message = await ctx.send(embed=embed)
+                else:
+                    await message.edit(embed=embed)
+
+            with ResultStream(message, db, user_id) as stream:
+                try:
+                    with metrics.span('search'):
+                        jobs = await job_scraper.search_jobs(
+                            query, location, limit, remote_only, min_salary, date_posted, local_only=local_only,
+                            filters=filters, on_progress=stream.update
+                        )
+
+                    if not jobs:
+                        embed = discord.Embed(
+                            title="No Jobs Found",
+                            description="Try different keywords or remove some filters",
+                            colour=red
+                        )
+                        await message.edit(embed=embed)
+                        return
+
+                    #results already streamed in stay put, the rest is appended to the same set
+                    await stream.finish(jobs)
+
+                except Exception as e:
+                    metrics.inc('command_errors', command='jobs')
+                    if await stream.flush():
+                        #a later page failed, the jobs already on screen are still good
+                        print(f"Search stopped after {stream.shown} jobs: {e}")
+                        jobs = stream.jobs
+                    else:
+                        embed = discord.Embed(
+                            title="Search Error",
+                            description=f"**Error:** {str(e)}\n\nPlease try again later or contact an admin.",
+                            colour=red
+                        )
+                        await message.edit(embed=embed)
+                        return
+        finally:
+            admission.release(ticket)
+
+        try:
+            await recent_jobs.add(recent_scope(ctx.guild.id if ctx.guild else None, ctx.channel.id), jobs[:5])
+        except Exception as e:
+            print(f"Failed to record recent jobs: {e}")
 
 
     @bot.command(name='jobsloc')
@@ -123,31 +257,46 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
 
     @bot.command(name='recent')
     async def recent_jobs_command(ctx, limit: int = 5):
-        if not recent_jobs:
+        limit = max(1, min(10, limit))
+        jobs_to_show = await recent_jobs.get(recent_scope(ctx.guild.id if ctx.guild else None, ctx.channel.id), limit)
+
+        if not jobs_to_show:
             embed = discord.Embed(
                 title="No Recent Jobs",
-                description="No jobs have been searched recently. Try using `.jobs` first",
+                description="No jobs have been searched in this channel recently. Try using `.jobs` first",
                 colour=white
             )
             await ctx.send(embed=embed)
             return
 
-        limit = max(1, min(10, limit))
-        jobs_to_show = recent_jobs[-limit:]
-
-        view = JobNavigationView(jobs_to_show, 0, ctx.author.id, db)
+        set_id = await db.create_result_set(ctx.author.id, jobs_to_show)
+        view = JobNavigationView(set_id, jobs_to_show[0], 0, len(jobs_to_show))
         embed = view.create_embed()
         embed.title = f"{embed.title}"
         await ctx.send(embed=embed, view=view)
 
 
     @bot.command(name='saved')
-    async def show_saved_jobs(ctx):
+    async def show_saved_jobs(ctx, action: str = "", fmt: str = "csv"):
         user_id = ctx.author.id
 
-        saved_jobs = db.get_bookmarks(user_id)
+        if action:
+            fmt = fmt.lower()
+            if action.lower() != 'export' or fmt not in EXPORT_FORMATS:
+                embed = discord.Embed(
+                    title="Invalid Option",
+                    description="**Usage:**\n`.saved` - View saved jobs\n`.saved export [csv|jsonl]` - Download saved jobs",
+                    colour=red
+                )
+                await ctx.send(embed=embed)
+                return
+            await export_saved_jobs(ctx, fmt)
+            return
+
+        total = await db.count_bookmarks(user_id)
+        page = await db.get_bookmark_page(user_id, limit=1) if total else []
 
-        if not saved_jobs:
+        if not page:
             embed = discord.Embed(
                 title="No Saved Jobs",
                 description="You haven't saved any jobs yet. Use the 'Save' button when viewing jobs",
@@ -156,17 +305,41 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
             await ctx.send(embed=embed)
             return
 
-        view = JobNavigationView(saved_jobs, 0, user_id, db)
+        bookmark_id, job = page[0]
+        view = SavedJobsView(bookmark_id, job, 0, total, owner=user_id)
         embed = view.create_embed()
         embed.title = f"{embed.title}"
         await ctx.send(embed=embed, view=view)
 
 
+    async def export_saved_jobs(ctx, fmt: str):
+        metrics.inc('commands', command='saved_export')
+        export, size = await export_bookmarks(db, ctx.author.id, fmt)
+        try:
+            if not export.rows and not export.skipped:
+                await ctx.send("You haven't saved any jobs yet.")
+                return
+
+            #uploads over the channel's limit would be rejected by Discord
+            size_limit = ctx.guild.filesize_limit if ctx.guild else 10 * 1024 * 1024
+            if size > size_limit:
+                await ctx.send(f"Your export is {size / 1024 / 1024:.1f} MB, over the "
+                               f"{size_limit / 1024 / 1024:.0f} MB upload limit here.")
+                return
+
+            summary = f"Exported {export.rows} saved jobs"
+            if export.skipped:
+                summary += f", {export.skipped} could not be read and were left out"
+            await ctx.send(summary, file=discord.File(export.path, filename=f"saved_jobs.{fmt}.gz"))
+        finally:
+            export.discard()
+
+
     @bot.command(name='history')
     async def search_history(ctx):
         user_id = ctx.author.id
 
-        history = db.get_search_history(user_id)
+        history = await db.get_search_history(user_id)
 
         if not history:
             embed = discord.Embed(
@@ -202,18 +375,58 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
     async def bot_health(ctx):
         embed = discord.Embed(title="Health Check", colour=green)
 
-        try:
-            _ = await job_scraper.search_jobs("test", limit=1)
+        #passive: reported from the breaker's view of recent requests, no probe search is spent
+        breaker = job_scraper.breaker
+        breaker_stats = breaker.stats()
+        if breaker.state == CLOSED:
             api_status = "Healthy"
             api_colour = green
-        except Exception as e:
-            api_status = f"Error: {str(e)[:100]}"
+        elif breaker.state == HALF_OPEN:
+            api_status = "Recovering, testing the API"
+            api_colour = white
+        else:
+            api_status = f"Unavailable, retrying in {breaker_stats['retry_in_s']:.0f}s"
             api_colour = red
+        if breaker.last_error and breaker.state != CLOSED:
+            api_status += f"\nLast error: {breaker.last_error[:100]}"
 
         embed.add_field(name="Bot Status", value="Online", inline=True)
         embed.add_field(name="API Status", value=api_status, inline=True)
         embed.add_field(name="Latency", value=f"{round(bot.latency * 1000)}ms", inline=True)
 
+        last_success = (datetime.utcfromtimestamp(breaker.last_success_at).strftime('%H:%M:%S UTC')
+                        if breaker.last_success_at else "none yet")
+        embed.add_field(
+            name="API Health",
+            value=f"{breaker_stats['calls']} recent calls, {breaker_stats['failure_rate']:.0%} failed, "
+                  f"p50 {breaker_stats['p50_ms']:.0f}ms / p99 {breaker_stats['p99_ms']:.0f}ms, "
+                  f"opened {breaker_stats['opened']} times, last success {last_success}",
+            inline=False
+        )
+
+        cache_stats = job_scraper.cache.stats()
+        embed.add_field(
+            name="Search Cache",
+            value=f"{cache_stats['entries']} entries, {cache_stats['hits']} hits, "
+                  f"{cache_stats['misses']} misses, {cache_stats['evictions']} evictions",
+            inline=False
+        )
+
+        scheduler_stats = job_scraper.scheduler.stats()
+        embed.add_field(
+            name="API Queue",
+            value=f"{scheduler_stats['queue_depth']} queued, avg wait {scheduler_stats['avg_wait_ms']}ms, "
+                  f"max wait {scheduler_stats['max_wait_ms']}ms, {scheduler_stats['throttled']} throttled",
+            inline=False
+        )
+
+        stage_lines = [
+            f"`{stage}` p50 {p50 * 1000:.0f}ms / p99 {p99 * 1000:.0f}ms ({count})"
+            for stage, (p50, p99, count) in metrics.stage_summary().items()
+        ]
+        if stage_lines:
+            embed.add_field(name="Stage Latency", value="\n".join(stage_lines)[:1024], inline=False)
+
         embed.colour = api_colour
         await ctx.send(embed=embed)
 
@@ -223,15 +436,15 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
         user_id = ctx.author.id
 
         if data_type.lower() == "saved":
-            count = db.clear_bookmarks(user_id)
+            count = await db.clear_bookmarks(user_id)
             await ctx.send(f"Cleared {count} saved jobs")
 
         elif data_type.lower() == "history":
-            count = db.clear_search_history(user_id)
+            count = await db.clear_search_history(user_id)
             await ctx.send(f"Cleared {count} search history entries")
 
         elif data_type.lower() == "all":
-            saved_count, history_count = db.clear_all_user_data(user_id)
+            saved_count, history_count = await db.clear_all_user_data(user_id)
             await ctx.send(f"Cleared all data: {saved_count} saved jobs, {history_count} history entries")
 
         else:
@@ -272,11 +485,17 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
         embed.add_field(
             name="Filters & Options",
             value="`--location [city]` - Specific location\n"
-                  "`--salary [amount]` - Minimum salary\n"
+                  "`--salary [amount]` - Minimum yearly salary, hourly pay is converted\n"
+                  "`--max-salary [amount]` - Maximum yearly salary\n"
+                  "`--type [fulltime,parttime,contract,intern]` - Employment types\n"
+                  "`--exclude [word,word]` - Skip jobs mentioning these words\n"
+                  "`--exclude-employer [name,name]` - Skip these employers\n"
+                  "`--max-age [days]` - Only jobs posted in the last N days\n"
                   "`--remote` - Remote jobs only\n"
                   "`--limit [1-20]` - Number of results\n"
                   "`--recent` - Jobs from today\n"
-                  "`--week` - Jobs from this week\n\u200b",
+                  "`--week` - Jobs from this week\n"
+                  "`--local` - Only search jobs the bot has already seen\n\u200b",
             inline=False
         )
 
@@ -292,11 +511,20 @@ def setup_commands(bot, db, job_scraper, recent_jobs, colors):
         embed.add_field(
             name="Viewing Saved jobs & Search history",
             value="`.saved` - View bookmarked jobs\n"
+                  "`.saved export [csv|jsonl]` - Download bookmarked jobs\n"
                   "`.history` - Your search history\n"
                   "`.recent` - Recently found jobs\n\u200b",
             inline=False
         )
 
+        embed.add_field(
+            name="Job Alerts",
+            value="`.alert python developer --remote` - Get notified about new postings\n"
+                  "`.alert list` - Your alerts\n"
+                  "`.alert remove [id]` - Remove an alert\n\u200b",
+            inline=False
+        )
+
         embed.add_field(
             name="Managing Saved jobs and Search history",
             value="`.clear saved` - Clear bookmarked jobs\n"
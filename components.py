@@ -1,7 +1,17 @@
 import aiohttp
 import asyncio
-from typing import List, Dict
+import json
+import time
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 import discord
+from cache import TTLCache, SingleFlight
+from ratelimit import RateLimitExceeded, RequestScheduler, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, retry_delay
+from metrics import metrics
+from models import Job
+from breaker import CircuitBreaker, CircuitOpenError
+from dedupe import DEFAULT_THRESHOLD, NearDuplicateDetector
+from filters import FilterSpec, compile_filter
 
 white = 0xffffff
 red = 0xff0000
@@ -9,20 +19,300 @@ green = 0x00ff00
 
 
 class RapidAPIJobScraper:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, pool_size: int = 100, per_host_limit: int = 10,
+                 dns_cache_ttl: int = 300, keepalive_timeout: float = 30.0,
+                 cache: TTLCache = None, max_pages: int = 5, page_concurrency: int = 3,
+                 scheduler: RequestScheduler = None, max_retries: int = 3,
+                 base_url: str = "https://jsearch.p.rapidapi.com", job_index=None,
+                 index_max_age: float = 6 * 3600, near_duplicate_threshold: int = DEFAULT_THRESHOLD,
+                 shared_store=None, fetch_lease: float = 15.0, breaker: CircuitBreaker = None,
+                 stale_ttl: float = 6 * 3600):
         self.api_key = api_key
-        self.base_url = "https://jsearch.p.rapidapi.com"
+        self.base_url = base_url
+
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+        #expired pages are kept a while longer to answer searches while the API is down
+        self.cache = cache if cache is not None else TTLCache(stale_ttl=stale_ttl)
+        self._inflight = SingleFlight()
+
+        #extra pages are only fetched when filtering leaves fewer jobs than asked for
+        self.page_size = 10
+        self.max_pages = max_pages
+        self.page_concurrency = page_concurrency
+
+        #paces every upstream call against the RapidAPI plan
+        self.scheduler = scheduler if scheduler is not None else RequestScheduler()
+        self.max_retries = max_retries
+
+        #tracks upstream health from real requests and stops sending them while it is down
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+        #reposts of the same job on other boards differ by a few fingerprint bits
+        self.near_duplicate_threshold = near_duplicate_threshold
+
+        #optional DatabaseManager whose full-text index can answer searches locally
+        self.job_index = job_index
+        self.index_max_age = index_max_age
+        self._background = set()
+
+        #optional SharedStore so shard processes reuse each other's pages instead of refetching
+        self.shared_store = shared_store
+        self.fetch_lease = fetch_lease
+
+        #upstream requests per priority, and prefetched pages not yet served to anyone
+        self.requests_by_priority = Counter()
+        self._prefetched = OrderedDict()
+        self.max_prefetched = 1000
+        self.prefetch_hits = 0
+
+        metrics.register_gauges('cache', self.cache.stats)
+        metrics.register_gauges('scheduler', self.scheduler.stats)
+        metrics.register_gauges('breaker', self.breaker.stats)
+        metrics.register_gauges('inflight', lambda: {'requests': len(self._inflight), 'shared': self._inflight.shared})
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        #opened lazily so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    'X-RapidAPI-Key': self.api_key or '',
+                    'X-RapidAPI-Host': 'jsearch.p.rapidapi.com'
+                },
+                timeout=aiohttp.ClientTimeout(total=30)
+            )
+        return self._session
+
+    async def close(self):
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
 
     async def search_jobs(self, query: str, location: str = "", limit: int = 10,
                           remote_only: bool = False, min_salary: int = None,
-                          date_posted: str = "all") -> List[Dict]:
+                          date_posted: str = "all", priority: int = PRIORITY_INTERACTIVE,
+                          local_only: bool = False, allow_local: bool = True,
+                          filters: FilterSpec = None,
+                          on_progress: Callable[[List[Job]], None] = None) -> List[Job]:
+        predicate = self._compile_filter(filters, remote_only, min_salary)
+        if local_only:
+            with metrics.span('local_search'):
+                return await self._search_local(query, location, limit, remote_only, min_salary, date_posted,
+                                                None, predicate)
+
         if not self.api_key:
             raise Exception("API key not configured")
 
-        headers = {
-            'X-RapidAPI-Key': self.api_key,
-            'X-RapidAPI-Host': 'jsearch.p.rapidapi.com'
-        }
+        with metrics.span('scraper_search'):
+            return await self._search(query, location, limit, remote_only, min_salary, date_posted,
+                                      priority, predicate, allow_local, on_progress)
+
+    async def search_local(self, query: str, location: str = "", limit: int = 10,
+                           remote_only: bool = False, min_salary: int = None,
+                           date_posted: str = "all", max_age: float = None,
+                           filters: FilterSpec = None) -> List[Job]:
+        predicate = self._compile_filter(filters, remote_only, min_salary)
+        return await self._search_local(query, location, limit, remote_only, min_salary, date_posted,
+                                        max_age, predicate)
+
+    async def warm(self, job_queries) -> int:
+        #startup preload for popular searches: pages still fresh in the shared store, cached there
+        #before a restart or by another shard process, go into the local cache
+        if self.shared_store is None:
+            return 0
+        warmed = 0
+        for job_query in job_queries:
+            key = self._cache_key(job_query.query, job_query.location, job_query.remote_only,
+                                  job_query.date_posted) + (1,)
+            if self.cache.peek(key) is not None:
+                continue
+            page = await self.shared_store.get_page(key)
+            if page is not None:
+                self._cache_shared_page(key, *page)
+                warmed += 1
+        return warmed
+
+    async def prefetch(self, job_query) -> bool:
+        #loads page 1 of a popular search ahead of demand, False when it is already cached
+        key = self._cache_key(job_query.query, job_query.location, job_query.remote_only, job_query.date_posted)
+        if self.cache.peek(key + (1,)) is not None:
+            return False
+        await self._get_page(key, 1, PRIORITY_PREFETCH)
+        #only hits while the prefetched copy is still the cached one count for it
+        self._prefetched[key + (1,)] = time.monotonic() + self.cache.ttl_for(key[3])
+        while len(self._prefetched) > self.max_prefetched:
+            self._prefetched.popitem(last=False)
+        return True
+
+    async def _search_local(self, query: str, location: str, limit: int, remote_only: bool, min_salary: int,
+                            date_posted: str, max_age: Optional[float], predicate: Callable) -> List[Job]:
+        if self.job_index is None:
+            return []
+        jobs = await self.job_index.search_job_index(
+            query, '' if remote_only else location, remote_only, min_salary, date_posted, limit * 2, max_age
+        )
+        return self._filter_and_dedupe(jobs, predicate)[:limit]
+
+    @staticmethod
+    def _compile_filter(filters: Optional[FilterSpec], remote_only: bool, min_salary: int) -> Callable:
+        #the search arguments that also shape the upstream query win over the spec
+        spec = (filters or FilterSpec())._replace(remote_only=remote_only, min_salary=min_salary)
+        return compile_filter(spec)
+
+    async def _search(self, query: str, location: str, limit: int, remote_only: bool,
+                      min_salary: int, date_posted: str, priority: int, predicate: Callable,
+                      allow_local: bool = True,
+                      on_progress: Callable[[List[Job]], None] = None) -> List[Job]:
+        key = self._cache_key(query, location, remote_only, date_posted)
+
+        #a cached API page beats the index, otherwise fresh enough local matches skip the API
+        if allow_local and self.job_index is not None and self.cache.peek(key + (1,)) is None:
+            local_jobs = await self._search_local(query, location, limit, remote_only, min_salary,
+                                                  date_posted, self.index_max_age, predicate)
+            metrics.inc('local_index_lookups', result='hit' if len(local_jobs) >= limit else 'miss')
+            if len(local_jobs) >= limit:
+                return local_jobs
+
+        try:
+            raw_jobs = await self._get_page(key, 1, priority)
+        except CircuitOpenError:
+            #with nothing cached either, indexed postings of any age are the last resort
+            if not allow_local or self.job_index is None:
+                raise
+            local_jobs = await self._search_local(query, location, limit, remote_only, min_salary,
+                                                  date_posted, None, predicate)
+            if not local_jobs:
+                raise
+            metrics.inc('stale_served', source='index')
+            return local_jobs
+
+        #filters and limit run after the cache so one raw page serves every variant
+        unique_jobs = self._filter_and_dedupe(raw_jobs, predicate)
+        if len(unique_jobs) >= limit or len(raw_jobs) < self.page_size:
+            return unique_jobs[:limit]
+
+        #API pages are consumed in order and only ever append, so partial results can be shown early
+        self._report_progress(on_progress, unique_jobs)
+
+        semaphore = asyncio.Semaphore(self.page_concurrency)
+
+        async def fetch(page: int) -> List[Job]:
+            async with semaphore:
+                return await self._get_page(key, page, priority)
+
+        pages = range(2, self.max_pages + 1)
+        tasks = [asyncio.ensure_future(fetch(page)) for page in pages]
+        try:
+            #pages are consumed in order so results stay stable, later ones keep loading meanwhile
+            for task in tasks:
+                try:
+                    page_jobs = await task
+                except Exception:
+                    break
+
+                raw_jobs = raw_jobs + page_jobs
+                unique_jobs = self._filter_and_dedupe(raw_jobs, predicate)
+                if len(unique_jobs) >= limit or len(page_jobs) < self.page_size:
+                    break
+                self._report_progress(on_progress, unique_jobs)
+        finally:
+            for task in tasks:
+                task.cancel()
+            #later pages may still fail while winding down, their errors are dropped on purpose
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return unique_jobs[:limit]
+
+    @staticmethod
+    def _report_progress(on_progress: Optional[Callable[[List[Job]], None]], jobs: List[Job]):
+        if on_progress is not None and jobs:
+            on_progress(list(jobs))
+
+    def _filter_and_dedupe(self, jobs: List[Job], predicate: Callable[[Job], bool]) -> List[Job]:
+        with metrics.span('filter_dedupe'):
+            return self._remove_duplicates([job for job in jobs if predicate(job)])
+
+    async def _get_page(self, key: Tuple, page: int, priority: int) -> List[Job]:
+        page_key = key + (page,)
+        jobs = self.cache.get(page_key)
+        metrics.inc('cache_lookups', result='miss' if jobs is None else 'hit')
+        if jobs is not None and self._prefetched.pop(page_key, 0) > time.monotonic():
+            self.prefetch_hits += 1
+        if jobs is None:
+            try:
+                jobs = await self._inflight.do(page_key, lambda: self._load_page(page_key, priority))
+            except Exception:
+                #an outdated page beats an error while the API is failing
+                jobs = self.cache.get_stale(page_key)
+                if jobs is None:
+                    raise
+                metrics.inc('stale_served', source='cache')
+        return jobs
+
+    @staticmethod
+    def _cache_key(query: str, location: str, remote_only: bool, date_posted: str) -> Tuple:
+        query = ' '.join(query.lower().split())
+        location = '' if remote_only else ' '.join(location.lower().split())
+        return query, location, remote_only, date_posted
+
+    async def _load_page(self, key: Tuple, priority: int) -> List[Job]:
+        ttl = self.cache.ttl_for(key[3])
+        if self.shared_store is None:
+            return await self._fetch_and_index(key, priority, ttl)
+
+        page = await self.shared_store.get_page(key)
+        if page is None and not await self.shared_store.claim(key, self.fetch_lease):
+            #another process is already fetching this page
+            page = await self.shared_store.wait_for_page(key, self.fetch_lease)
+        if page is not None:
+            return self._cache_shared_page(key, *page)
+
+        try:
+            jobs = await self._fetch_and_index(key, priority, ttl)
+        except BaseException:
+            await asyncio.shield(self.shared_store.release(key))
+            raise
+        self._run_in_background(self.shared_store.set_page(key, jobs, ttl))
+        return jobs
+
+    def _cache_shared_page(self, key: Tuple, jobs: List[Job], expires_at: float) -> List[Job]:
+        #the page may have been cached by another process minutes ago, only its remaining life is kept
+        self.cache.set(key, jobs, sum(job.approx_size() for job in jobs), expires_at - time.time())
+        return jobs
+
+    async def _fetch_and_index(self, key: Tuple, priority: int, ttl: float) -> List[Job]:
+        jobs, size = await self._fetch_page(key, priority)
+        self.cache.set(key, jobs, size, ttl)
+        if self.job_index is not None:
+            self._run_in_background(self.job_index.index_jobs(jobs))
+        return jobs
+
+    def _run_in_background(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background_done)
+
+    def _background_done(self, task: asyncio.Task):
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background task failed: {task.exception()}")
+
+    async def _fetch_page(self, key: Tuple, priority: int) -> Tuple[List[Job], int]:
+        query, location, remote_only, date_posted, page = key
 
         search_query = query
         if location and not remote_only:
@@ -32,182 +322,325 @@ class RapidAPIJobScraper:
 
         params = {
             'query': search_query.strip(),
-            'page': '1',
+            'page': str(page),
             'num_pages': '1',
             'date_posted': date_posted
         }
 
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                        f"{self.base_url}/search",
-                        headers=headers,
-                        params=params,
-                        timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-
-                    if response.status == 429:
-                        raise Exception("Rate limit exceeded. Please try again later.")
-                    elif response.status == 401:
-                        raise Exception("Invalid API key.")
-                    elif response.status != 200:
-                        raise Exception(f"API Error: {response.status}")
-
-                    data = await response.json()
-                    jobs = data.get('data', [])
-
-                    filtered_jobs = self._filter_jobs(jobs, min_salary, remote_only)
-
-                    unique_jobs = self._remove_duplicates(filtered_jobs)
-
-
-                    return unique_jobs[:limit]
+            session = self._get_session()
+            #seconds this page may still spend waiting out 429s before it gives up
+            retry_budget = self.scheduler.max_wait
+            for attempt in range(self.max_retries + 1):
+                #while the API is down, fail now rather than after a full timeout
+                self.breaker.check()
+                started = time.monotonic()
+                healthy, error = None, None
+                try:
+                    #a half-open probe slot is taken by check(), so even a failed or cancelled
+                    #wait for quota has to reach record() below to give it back
+                    with metrics.span('api_queue'):
+                        await self.scheduler.acquire(priority)
+                    self.requests_by_priority[priority] += 1
+
+                    started = time.monotonic()
+                    with metrics.span('api_request'):
+                        async with session.get(f"{self.base_url}/search", params=params) as response:
+                            metrics.inc('api_responses', status=response.status)
+                            #any answer short of a server error means the API itself is up
+                            healthy = response.status < 500
+                            error = f"API Error: {response.status}"
+
+                            if response.status == 429:
+                                delay = retry_delay(response.headers.get('Retry-After'), attempt)
+                                self.scheduler.backoff(delay)
+                                #a window longer than the search can wait, e.g. a used up plan quota,
+                                #fails now so a stale page can be served instead
+                                if attempt == self.max_retries or delay > retry_budget:
+                                    raise RateLimitExceeded("Rate limit exceeded. Please try again later.")
+                                #requeue behind the upstream window instead of failing the search
+                                retry_budget -= delay
+                                continue
+                            elif response.status == 401:
+                                raise Exception("Invalid API key.")
+                            elif response.status != 200:
+                                raise Exception(f"API Error: {response.status}")
+
+                            body = await response.read()
+                            data = json.loads(body)
+                            #raw payloads are converted once here and never kept
+                            jobs = [Job.from_dict(job) for job in data.get('data') or []]
+                            return jobs, sum(job.approx_size() for job in jobs)
+                except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                    healthy, error = False, type(e).__name__
+                    raise
+                finally:
+                    #every outcome feeds the breaker's rolling view of upstream health
+                    self.breaker.record(healthy, time.monotonic() - started, error)
 
         except asyncio.TimeoutError:
+            metrics.inc('api_responses', status='timeout')
             raise Exception("Search timed out. Please try again.")
-        except Exception as e:
-            raise e
-
-    def _filter_jobs(self, jobs: List[Dict], min_salary: int = None,
-                     remote_only: bool = False) -> List[Dict]:
-        filtered = []
-        for job in jobs:
-            if not self._is_valid_job(job):
-                continue
-
-            if min_salary and job.get('job_min_salary'):
-                if job.get('job_min_salary', 0) < min_salary:
-                    continue
-
-            if remote_only:
-                job_title = job.get('job_title', '').lower()
-                job_desc = job.get('job_description', '').lower()
-                if not ('remote' in job_title or 'remote' in job_desc):
-                    continue
-
-            filtered.append(job)
-        return filtered
 
-    @staticmethod
-    def _is_valid_job(job: Dict) -> bool:
-        required_fields = ['job_title', 'employer_name']
-        return all(job.get(field) for field in required_fields)
-
-    @staticmethod
-    def _remove_duplicates(jobs: List[Dict]) -> List[Dict]:
+    def _remove_duplicates(self, jobs: List[Job]) -> List[Job]:
         seen = set()
+        near_duplicates = NearDuplicateDetector(self.near_duplicate_threshold)
         unique_jobs = []
 
         for job in jobs:
-            key = (job.get('job_title', '').lower(),
-                   job.get('employer_name', '').lower())
-            if key not in seen:
-                seen.add(key)
+            key = (job.job_title.lower(),
+                   job.employer_name.lower())
+            if key in seen:
+                continue
+            seen.add(key)
+            if near_duplicates.add_job(job):
                 unique_jobs.append(job)
 
         return unique_jobs
 
 
-class JobNavigationView(discord.ui.View):
-    def __init__(self, jobs: List[Dict], current_index: int = 0, user_id: int = None, db=None):
-        super().__init__(timeout=300)
-        self.jobs = jobs
-        self.current_index = current_index
-        self.user_id = user_id
-        self.showing_full = False
-        self.db = db
+def render_job_embed(job: Job, show_full: bool = False) -> discord.Embed:
+    description = job.job_description
+    if not show_full:
+        words = description.split()
+        if len(words) > 150:
+            description = ' '.join(words[:150]) + "...\n\n*Click 'Show Full Description' for more details*"
+
+    embed = discord.Embed(
+        title=job.job_title or 'N/A',
+        description=description[:4000],
+        colour=white,
+        url=job.job_apply_link or ''
+    )
+
+    embed.add_field(name="Company", value=job.employer_name or 'N/A', inline=True)
+    embed.add_field(name="Location", value=job.job_city or 'Remote', inline=True)
+    embed.add_field(name="Type", value=job.job_employment_type or 'N/A', inline=True)
+
+    if job.job_min_salary:
+        salary = f"${job.job_min_salary:,}"
+        if job.job_max_salary:
+            salary += f" - ${job.job_max_salary:,}"
+        if job.job_salary_period and job.job_salary_period != 'YEAR':
+            salary += f" per {job.job_salary_period.lower()}"
+        embed.add_field(name="Salary", value=salary, inline=True)
+
+    if job.job_posted_at_datetime_utc:
+        posted_date = job.job_posted_at_datetime_utc
+        if 'T' in posted_date:
+            posted_date = posted_date.split('T')[0]
+        embed.add_field(name="Posted", value=posted_date, inline=True)
+
+    return embed
+
+
+#rendered embeds shared by every navigation message, keyed by what was rendered
+rendered_embeds = TTLCache(max_entries=256, max_bytes=8 * 1024 * 1024, default_ttl=600)
+#result set id -> number of jobs, so a click can work out its position without reading the set
+result_set_totals = TTLCache(max_entries=4096, max_bytes=1024 * 1024, default_ttl=600)
+#neighbour renders still running, held so they aren't collected mid-flight
+prerender_tasks = set()
+
+#(action, label, style) for each navigation button, in display order
+NAVIGATION_BUTTONS = (
+    ('prev', '⟵', discord.ButtonStyle.secondary),
+    ('next', '⟶', discord.ButtonStyle.secondary),
+    ('full', 'Show Full Description', discord.ButtonStyle.primary),
+    ('save', 'Save Job', discord.ButtonStyle.secondary),
+    ('apply', 'Apply Now', discord.ButtonStyle.success)
+)
+
+
+class NavigationButton(discord.ui.DynamicItem[discord.ui.Button],
+                       template=r'nav:(?P<kind>jobs|saved):(?P<action>[a-z]+):(?P<owner>[0-9]+):'
+                                r'(?P<anchor>[0-9]+):(?P<index>[0-9]+):(?P<full>[01])'):
+    #the whole navigation state lives in the custom_id, so any process can answer a click,
+    #even after a restart, and nothing is held in memory per open message
+    def __init__(self, kind: str, action: str, owner: int, anchor: int, index: int, show_full: bool,
+                 label: str = None, style: discord.ButtonStyle = discord.ButtonStyle.secondary,
+                 disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label=label or action, style=style, disabled=disabled,
+            custom_id=f"nav:{kind}:{action}:{owner}:{anchor}:{index}:{int(show_full)}"
+        ))
+        self.kind = kind
+        self.action = action
+        self.owner = owner
+        self.anchor = anchor
+        self.index = index
+        self.show_full = show_full
+
+    @classmethod
+    async def from_custom_id(cls, _interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match['kind'], match['action'], int(match['owner']), int(match['anchor']),
+                   int(match['index']), match['full'] == '1', item.label, item.style)
+
+    async def callback(self, interaction: discord.Interaction):
+        view_class = SavedJobsView if self.kind == 'saved' else JobNavigationView
+        await view_class.dispatch(interaction, self.action, self.owner, self.anchor, self.index, self.show_full)
 
-    def get_current_job(self) -> Dict:
-        return self.jobs[self.current_index] if self.jobs else {}
 
-    def create_embed(self, show_full: bool = False) -> discord.Embed:
-        job = self.get_current_job()
-        if not job:
-            return discord.Embed(title="No job data", colour=red)
-
-        description = job.get('job_description', 'No description')
-        if not show_full:
-            words = description.split()
-            if len(words) > 150:
-                description = ' '.join(words[:150]) + "...\n\n*Click 'Show Full Description' for more details*"
-
-        embed = discord.Embed(
-            title=job.get('job_title', 'N/A'),
-            description=description[:4000],
-            colour=white,
-            url=job.get('job_apply_link', '')
-        )
-
-        embed.add_field(name="Company", value=job.get('employer_name', 'N/A'), inline=True)
-        embed.add_field(name="Location", value=job.get('job_city', 'Remote'), inline=True)
-        embed.add_field(name="Type", value=job.get('job_employment_type', 'N/A'), inline=True)
-
-        if job.get('job_min_salary'):
-            salary = f"${job.get('job_min_salary'):,}"
-            if job.get('job_max_salary'):
-                salary += f" - ${job.get('job_max_salary'):,}"
-            embed.add_field(name="Salary", value=salary, inline=True)
-
-        if job.get('job_posted_at_datetime_utc'):
-            posted_date = job.get('job_posted_at_datetime_utc')
-            if 'T' in posted_date:
-                posted_date = posted_date.split('T')[0]
-            embed.add_field(name="Posted", value=posted_date, inline=True)
-
-        embed.set_footer(text=f"Job {self.current_index + 1} of {len(self.jobs)}")
+class JobNavigationView(discord.ui.View):
+    kind = 'jobs'
+
+    def __init__(self, anchor: int, job: Job, index: int, total: int, show_full: bool = False,
+                 owner: int = 0, disabled: bool = False):
+        #anchor is the result set id; views never time out, expired sets are detected on click
+        super().__init__(timeout=None)
+        self.anchor = anchor
+        self.job = job
+        self.current_index = index
+        self.total = total
+        self.showing_full = show_full
+        self.owner = owner
+        if self.kind == 'jobs':
+            result_set_totals.set(anchor, total, 64, result_set_totals.default_ttl)
+
+        for action, label, style in NAVIGATION_BUTTONS:
+            if action == 'full' and show_full:
+                label = 'Show Less'
+            self.add_item(NavigationButton(self.kind, action, owner, anchor, index, show_full, label, style,
+                                           disabled))
+
+    def get_current_job(self) -> Optional[Job]:
+        return self.job
+
+    def total_jobs(self) -> int:
+        return self.total
+
+    def create_embed(self, show_full: bool = None) -> discord.Embed:
+        show_full = self.showing_full if show_full is None else show_full
+        #each job is rendered once per mode, repeat clicks are a cache lookup
+        key = self.render_key(show_full)
+        embed = rendered_embeds.get(key)
+        if embed is None:
+            job = self.get_current_job()
+            if not job:
+                return discord.Embed(title="No job data", colour=red)
+            with metrics.span('render_job'):
+                embed = render_job_embed(job, show_full)
+            rendered_embeds.set(key, embed, job.approx_size(), rendered_embeds.default_ttl)
+        return self.add_footer(embed)
+
+    def add_footer(self, embed: discord.Embed) -> discord.Embed:
+        embed.set_footer(text=f"Job {self.current_index + 1} of {self.total_jobs()}")
         return embed
 
-    @discord.ui.button(label='⟵', style=discord.ButtonStyle.secondary)
-    async def previous_job(self, interaction: discord.Interaction, _button: discord.ui.Button):
-        if self.current_index > 0:
-            self.current_index -= 1
-        else:
-            self.current_index = len(self.jobs) - 1
-        embed = self.create_embed(self.showing_full)
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label='⟶', style=discord.ButtonStyle.secondary)
-    async def next_job(self, interaction: discord.Interaction, _button: discord.ui.Button):
-        if self.current_index < len(self.jobs) - 1:
-            self.current_index += 1
-        else:
-            self.current_index = 0
-        embed = self.create_embed(self.showing_full)
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label='Show Full Description', style=discord.ButtonStyle.primary)
-    async def toggle_description(self, interaction: discord.Interaction, button: discord.ui.Button):
-        self.showing_full = not self.showing_full
-        button.label = 'Show Less' if self.showing_full else 'Show Full Description'
-
-        embed = self.create_embed(self.showing_full)
-        await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label='Save Job', style=discord.ButtonStyle.secondary)
-    async def save_job(self, interaction: discord.Interaction, _button: discord.ui.Button):
-        if not self.user_id or not self.db:
-            await interaction.response.send_message("Unable to identify user.", ephemeral=True)
+    def render_key(self, show_full: bool, index: int = None) -> Tuple:
+        return self.kind, self.anchor, self.current_index if index is None else index, show_full
+
+    @classmethod
+    def from_cache(cls, owner: int, anchor: int, index: int, show_full: bool,
+                   step: int = 0) -> Optional[Tuple['JobNavigationView', discord.Embed]]:
+        #a click on a job that is already rendered needs no database read or decode
+        total = result_set_totals.get(anchor)
+        if not total:
+            return None
+        position = (index + step) % total
+        embed = rendered_embeds.get((cls.kind, anchor, position, show_full))
+        if embed is None:
+            return None
+        view = cls(anchor, None, position, total, show_full, owner)
+        return view, view.add_footer(embed)
+
+    def schedule_prerender(self, db):
+        #renders the jobs either side once the response has gone out, so the next click is a cache hit
+        task = asyncio.ensure_future(self.prerender_neighbours(db))
+        prerender_tasks.add(task)
+        task.add_done_callback(prerender_tasks.discard)
+
+    async def prerender_neighbours(self, db):
+        if self.total < 2:
             return
+        try:
+            for step in (-1, 1):
+                key = self.render_key(self.showing_full, (self.current_index + step) % self.total)
+                if rendered_embeds.peek(key) is not None:
+                    continue
+                result = await db.get_result_job(self.anchor, self.current_index, step)
+                if result is None:
+                    return
+                position, _total, job = result
+                with metrics.span('render_job'):
+                    embed = render_job_embed(job, self.showing_full)
+                rendered_embeds.set(self.render_key(self.showing_full, position), embed, job.approx_size(),
+                                    rendered_embeds.default_ttl)
+        except Exception as e:
+            print(f"Pre-rendering neighbours failed: {e}")
+
+    @classmethod
+    async def load(cls, db, owner: int, anchor: int, index: int, show_full: bool,
+                   step: int = 0) -> Optional['JobNavigationView']:
+        #only the job being shown is read back from the stored result set
+        result = await db.get_result_job(anchor, index, step)
+        if result is None:
+            return None
+        position, total, job = result
+        return cls(anchor, job, position, total, show_full, owner)
+
+    @classmethod
+    async def dispatch(cls, interaction: discord.Interaction, action: str, owner: int, anchor: int,
+                       index: int, show_full: bool):
+        db = interaction.client.db
+        if action == 'full':
+            show_full = not show_full
+        step = {'prev': -1, 'next': 1}.get(action, 0)
+        moving = action in ('prev', 'next', 'full')
+
+        #moving to a job that is already rendered skips reading the job back
+        cached = cls.from_cache(owner, anchor, index, show_full, step) if moving else None
+        if cached is not None:
+            view, embed = cached
+        else:
+            view = await cls.load(db, owner, anchor, index, show_full, step)
+            if view is None:
+                await cls.expire(interaction)
+                return
+            embed = view.create_embed() if moving else None
+
+        #a search still streaming into this message keeps showing the job the user moved to
+        stream = result_streams.get(interaction.message.id) if interaction.message else None
+        if stream is not None and cls.kind == 'jobs':
+            stream.follow(view.current_index, view.showing_full)
+
+        if moving:
+            await interaction.response.edit_message(embed=embed, view=view)
+            view.schedule_prerender(db)
+        elif action == 'save':
+            await view.save_job(interaction, db)
+        elif action == 'apply':
+            await view.apply_now(interaction)
+
+    @classmethod
+    async def expire(cls, interaction: discord.Interaction):
+        #the stored results are gone, leave the message in place with its buttons disabled
+        view = discord.ui.View.from_message(interaction.message, timeout=None)
+        for item in view.children:
+            item.disabled = True
+        await interaction.response.edit_message(view=view)
+        await interaction.followup.send("These results have expired. Run the search again for fresh ones.",
+                                        ephemeral=True)
 
+    async def save_job(self, interaction: discord.Interaction, db):
         job = self.get_current_job()
         if not job:
             await interaction.response.send_message("No job to save.", ephemeral=True)
             return
 
-        success = self.db.add_bookmark(self.user_id, job)
+        #saved for whoever clicked, the view no longer remembers who searched
+        success = await db.add_bookmark(interaction.user.id, job)
 
         if success:
             await interaction.response.send_message(
-                f"Saved '{job.get('job_title')}' at {job.get('employer_name')}",
+                f"Saved '{job.job_title}' at {job.employer_name}",
                 ephemeral=True
             )
         else:
             await interaction.response.send_message("Job has already been saved", ephemeral=True)
 
-    @discord.ui.button(label='Apply Now', style=discord.ButtonStyle.success)
-    async def apply_now(self, interaction: discord.Interaction, _button: discord.ui.Button):
+    async def apply_now(self, interaction: discord.Interaction):
         job = self.get_current_job()
-        apply_link = job.get('job_apply_link') if job else None
+        apply_link = job.job_apply_link if job else None
 
         if apply_link:
             embed = discord.Embed(
@@ -219,9 +652,145 @@ class JobNavigationView(discord.ui.View):
         else:
             await interaction.response.send_message("No application link available.")
 
-    async def on_timeout(self):
-        for item in self.children:
-            item.disabled = True
 
+#message id -> stream for searches whose results are still arriving
+result_streams: Dict[int, 'ResultStream'] = {}
+
+
+class ResultStream:
+    #grows a .jobs message while the search is still running: the first job goes out as soon as
+    #any page has one, later pages extend the stored result set and the footer
+    def __init__(self, message, db, user_id: int, min_edit_interval: float = 1.0):
+        self.message = message
+        self.db = db
+        self.user_id = user_id
+        #Discord allows about five edits per five seconds on a message
+        self.min_edit_interval = min_edit_interval
+
+        self.set_id = None
+        self.jobs = []
+        self.shown = 0
+        self.index = 0
+        self.show_full = False
+        self.started = asyncio.get_running_loop().time()
+
+        self._pending = None
+        self._last_edit = 0.0
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    def __enter__(self) -> 'ResultStream':
+        result_streams[self.message.id] = self
+        return self
+
+    def __exit__(self, *_exc):
+        result_streams.pop(self.message.id, None)
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+    def update(self, jobs: List[Job]):
+        #called by the scraper as pages land, the edit itself is debounced in the background
+        self._pending = jobs
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    def follow(self, index: int, show_full: bool):
+        self.index = index
+        self.show_full = show_full
+
+    async def flush(self) -> int:
+        #waits for a debounced edit still in flight, returns how many jobs are on screen
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+        return self.shown
+
+    async def finish(self, jobs: List[Job]) -> Optional[int]:
+        #the complete result replaces whatever is pending and is shown once the debounce allows
+        self._pending = jobs
+        await self.flush()
+        if self._pending is not None:
+            await self._flush_later()
+        return self.set_id
+
+    async def _flush_later(self):
+        delay = self._last_edit + self.min_edit_interval - asyncio.get_running_loop().time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with self._lock:
+            await self._flush()
+
+    async def _flush(self):
+        jobs, self._pending = self._pending, None
+        if not jobs or len(jobs) <= self.shown:
+            return
+
+        #positions never move, so clicks on an earlier edit still find the same job
+        with metrics.span('db_result_set'):
+            if self.set_id is None:
+                self.set_id = await self.db.create_result_set(self.user_id, jobs)
+            else:
+                await self.db.extend_result_set(self.set_id, jobs[len(self.jobs):], len(self.jobs))
+        self.jobs = jobs
+
+        with metrics.span('render_embed'):
+            index = min(self.index, len(jobs) - 1)
+            view = JobNavigationView(self.set_id, jobs[index], index, len(jobs), self.show_full)
+            embed = view.create_embed()
+        with metrics.span('discord_edit'):
+            await self.message.edit(embed=embed, view=view)
+
+        if not self.shown:
+            #time to first result is the wait users actually notice
+            metrics.observe('first_result', asyncio.get_running_loop().time() - self.started)
+        self.shown = len(jobs)
+        self._last_edit = asyncio.get_running_loop().time()
+
+
+class SavedJobsView(JobNavigationView):
+    kind = 'saved'
+
+    def __init__(self, bookmark_id: int, job: Job, index: int, total: int, show_full: bool = False,
+                 owner: int = 0, disabled: bool = False):
+        #anchor is the bookmark id and owner the user whose bookmarks these are
+        super().__init__(bookmark_id, job, index, total, show_full, owner, disabled)
+
+    def render_key(self, show_full: bool, index: int = None) -> Tuple:
+        return self.kind, self.anchor, show_full
+
+    @classmethod
+    def from_cache(cls, owner: int, anchor: int, index: int, show_full: bool,
+                   step: int = 0) -> Optional[Tuple['SavedJobsView', discord.Embed]]:
+        #embeds are keyed by bookmark id, a neighbour's id is only known from the database
+        return None
+
+    def schedule_prerender(self, db):
+        pass
+
+    @classmethod
+    async def load(cls, db, owner: int, anchor: int, index: int, show_full: bool,
+                   step: int = 0) -> Optional['SavedJobsView']:
+        total = await db.count_bookmarks(owner)
+
+        #fetch only the neighbouring bookmark through the keyset cursor
+        if step > 0:
+            page = await db.get_bookmark_page(owner, before_id=anchor, limit=1)
+            position = index + 1
+            if not page:
+                page = await db.get_bookmark_page(owner, limit=1)
+                position = 0
+        elif step < 0:
+            page = await db.get_bookmark_page(owner, after_id=anchor, limit=1)
+            position = index - 1
+            if not page:
+                page = await db.get_bookmark_page(owner, after_id=0, limit=1)
+                position = total - 1
+        else:
+            #the bookmark itself, or the next older one if it was removed
+            page = await db.get_bookmark_page(owner, before_id=anchor + 1, limit=1)
+            position = index
 
+        if not page:
+            return None
 
+        bookmark_id, job = page[0]
+        return cls(bookmark_id, job, min(max(position, 0), max(total - 1, 0)), total, show_full, owner)
@@ -1,27 +1,216 @@
+import asyncio
 import sqlite3
 import json
-from typing import List, Dict
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+from metrics import metrics
+from models import Job
+from filters import annual_salary
+
+#date_posted values mapped to how many days back a posting may be
+POSTED_WINDOWS = {
+    'today': 1,
+    '3days': 3,
+    'week': 7,
+    'month': 30
+}
+
+
+def bookmark_key(job: Job) -> str:
+    return f"{job.job_title.lower()}|{job.employer_name.lower()}"
+
+
+def encode_job(job: Job) -> bytes:
+    return zlib.compress(json.dumps(job.to_dict(), separators=(',', ':')).encode('utf-8'))
+
+
+def decode_job(job_data) -> Optional[Job]:
+    #rows written before compression hold the full raw JSON payload as text
+    try:
+        if isinstance(job_data, bytes):
+            job_data = zlib.decompress(job_data)
+        return Job.from_dict(json.loads(job_data))
+    except (zlib.error, ValueError, AttributeError):
+        return None
+
+
+def fts_match_expression(query: str, remote_only: bool = False) -> str:
+    #every word must appear somewhere in the job, quoted so user input can't inject FTS syntax
+    words = [word.replace('"', '') for word in query.lower().split()]
+    terms = [f'"{word}"' for word in words if word]
+    if terms and remote_only:
+        terms.append('"remote"')
+    return ' AND '.join(terms)
+
+
+def posted_cutoff(date_posted: str) -> str:
+    days = POSTED_WINDOWS.get(date_posted)
+    if days is None:
+        return ''
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return cutoff.strftime('%Y-%m-%dT%H:%M:%S')
+
 
 class DatabaseManager:
-    def __init__(self, db_path: str = "job_bot.db"):
+    def __init__(self, db_path: str = "job_bot.db", reader_count: int = 4,
+                 history_batch_size: int = 50, history_flush_interval: float = 0.5,
+                 job_index_retention: float = 7 * 24 * 3600, busy_timeout_ms: int = 5000,
+                 result_set_retention: float = 7 * 24 * 3600):
         self.db_path = db_path
+        self.busy_timeout_ms = busy_timeout_ms
+
+        #schema version found on disk before migrating, for the startup report
+        self.schema_version_at_start = None
+
+        #local full-text index of every job fetched, disabled if SQLite lacks FTS5
+        self.job_index_enabled = True
+        self.job_index_retention = job_index_retention
+        self._index_expired_at = 0.0
+
+        #buttons on result messages older than this report the results as expired
+        self.result_set_retention = result_set_retention
+        self._result_sets_expired_at = 0.0
+
+        #one connection per executor thread, kept open for the life of the bot
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+        #WAL lets the pooled readers run alongside the single writer
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=reader_count, thread_name_prefix='db-reader')
+
+        #search history is written behind in group commits
+        self.history_batch_size = history_batch_size
+        self.history_flush_interval = history_flush_interval
+        self._pending_history = []
+        self._flushing_history = []
+        self._history_flush_lock = asyncio.Lock()
+        self._history_timer = None
+        self._history_flush_task = None
+
         self.init_database()
+        metrics.register_gauges('history_queue', lambda: {'pending': len(self._pending_history)})
+
+    def _connection(self, writer: bool = False) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            #writers take the lock when their transaction starts, so with several shard processes
+            #on one file they queue on busy_timeout instead of failing a lock upgrade mid-transaction
+            conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                                   isolation_level='IMMEDIATE' if writer else '')
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _run_write(self, fn, args):
+        conn = self._connection(writer=True)
+        try:
+            result = fn(conn.cursor(), *args)
+            conn.commit()
+            return result
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _run_read(self, fn, args):
+        return fn(self._connection().cursor(), *args)
+
+    async def _write(self, fn, *args):
+        metrics.inc('db_ops', op=fn.__name__.lstrip('_'), kind='write')
+        loop = asyncio.get_running_loop()
+        with metrics.span('db_write'):
+            return await loop.run_in_executor(self._writer, self._run_write, fn, args)
+
+    async def _read(self, fn, *args):
+        metrics.inc('db_ops', op=fn.__name__.lstrip('_'), kind='read')
+        loop = asyncio.get_running_loop()
+        with metrics.span('db_read'):
+            return await loop.run_in_executor(self._readers, self._run_read, fn, args)
+
+    async def close(self):
+        if self._history_timer is not None:
+            self._history_timer.cancel()
+            self._history_timer = None
+        #nothing queued may be lost on shutdown
+        await self.flush_search_history()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._shutdown)
+
+    def _shutdown(self):
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
 
     def init_database(self):
-        conn = sqlite3.connect(self.db_path)
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        #shard processes starting together all run this
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout_ms}')
+        conn.execute('PRAGMA journal_mode=WAL')
         cursor = conn.cursor()
+        migrations = self._migrations()
+
+        try:
+            #user_version records how many migrations the file has had, a current schema costs one read
+            version = cursor.execute('PRAGMA user_version').fetchone()[0]
+            self.schema_version_at_start = version
+            if version < len(migrations):
+                cursor.execute('BEGIN IMMEDIATE')
+                try:
+                    #another process may have migrated while this one waited for the lock
+                    version = cursor.execute('PRAGMA user_version').fetchone()[0]
+                    for migration in migrations[version:]:
+                        migration(cursor)
+                    cursor.execute(f'PRAGMA user_version={len(migrations)}')
+                    cursor.execute('COMMIT')
+                except Exception:
+                    cursor.execute('ROLLBACK')
+                    raise
+
+            self.job_index_enabled = self._ensure_job_index_fts(cursor)
+        finally:
+            conn.close()
 
+    def _migrations(self) -> list:
+        #append only: a migration's position is its schema version. Databases from before versioning
+        #start at 0, so the first ones use IF NOT EXISTS and cope with any of their tables existing
+        return [
+            self._create_core_tables,
+            self._create_job_index,
+            self._create_alert_tables,
+            self._create_recent_jobs,
+            self._annualize_indexed_salaries,
+            self._index_history_time,
+            self._create_result_sets
+        ]
+
+    @classmethod
+    def _create_core_tables(cls, cursor: sqlite3.Cursor):
         #bookmarks entity
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS bookmarks (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id TEXT NOT NULL,
+                job_key TEXT NOT NULL,
                 job_title TEXT NOT NULL,
                 employer_name TEXT NOT NULL,
-                job_data TEXT NOT NULL,
+                job_data BLOB NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        cls._migrate_bookmarks(cursor)
 
         #search history entity
         cursor.execute('''
@@ -34,91 +223,604 @@ class DatabaseManager:
         ''')
 
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookmarks_user_id ON bookmarks(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_user_id ON search_history(user_id)')
-
-        conn.commit()
-        conn.close()
-
-    def add_bookmark(self, user_id: int, job: Dict) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_bookmarks_user_job ON bookmarks(user_id, job_key)')
+        cursor.execute('DROP INDEX IF EXISTS idx_history_user_id')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_user_time ON search_history(user_id, timestamp)')
 
+    @staticmethod
+    def _create_job_index(cursor: sqlite3.Cursor):
+        #job index entity, filterable columns plus the compressed record
         cursor.execute('''
-            SELECT id FROM bookmarks 
-            WHERE user_id = ? AND job_title = ? AND employer_name = ?
-        ''', (str(user_id), job.get('job_title', ''), job.get('employer_name', '')))
-
-        if cursor.fetchone():
-            conn.close()
+            CREATE TABLE IF NOT EXISTS job_index (
+                job_key TEXT PRIMARY KEY,
+                job_title TEXT NOT NULL,
+                employer_name TEXT NOT NULL,
+                job_city TEXT,
+                min_salary REAL,
+                posted_at TEXT,
+                indexed_at REAL NOT NULL,
+                job_data BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_index_indexed_at ON job_index(indexed_at)')
+
+    @staticmethod
+    def _ensure_job_index_fts(cursor: sqlite3.Cursor) -> bool:
+        #checked every boot, the SQLite build may have gained or lost FTS5 since the last one
+        if cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'job_index_fts'").fetchone():
+            return True
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS job_index_fts USING fts5(
+                    job_title, employer_name, job_city, job_description
+                )
+            ''')
+            return True
+        except sqlite3.OperationalError:
             return False
 
+    @staticmethod
+    def _create_alert_tables(cursor: sqlite3.Cursor):
+        #job alert entities, seen postings are kept as 64-bit hashes per subscription
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                guild_id TEXT,
+                channel_id TEXT NOT NULL,
+                raw_query TEXT NOT NULL,
+                query_key TEXT NOT NULL,
+                last_checked REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_seen (
+                alert_id INTEGER NOT NULL,
+                job_hash INTEGER NOT NULL,
+                seen_at REAL NOT NULL,
+                PRIMARY KEY (alert_id, job_hash)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_user_id ON alerts(user_id)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alerts_query_key ON alerts(query_key)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_alert_seen_time ON alert_seen(seen_at)')
+
+    @staticmethod
+    def _create_recent_jobs(cursor: sqlite3.Cursor):
+        #recent results per channel, trimmed to the newest few on every insert
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS recent_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                scope TEXT NOT NULL,
+                job_data BLOB NOT NULL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_recent_jobs_scope ON recent_jobs(scope, id)')
+
+    @staticmethod
+    def _annualize_indexed_salaries(cursor: sqlite3.Cursor):
+        #the index used to store salaries in the posting's own period, salary filters compare yearly
+        rows = cursor.execute('SELECT job_key, job_data FROM job_index WHERE min_salary IS NOT NULL').fetchall()
+        updates = []
+        for job_key, job_data in rows:
+            job = decode_job(job_data)
+            if job is not None:
+                updates.append((annual_salary(job.job_min_salary, job.job_salary_period), job_key))
+        cursor.executemany('UPDATE job_index SET min_salary = ? WHERE job_key = ?', updates)
+
+    @staticmethod
+    def _create_result_sets(cursor: sqlite3.Cursor):
+        #search results behind each navigation message, read back one job per button click
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS result_sets (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
         cursor.execute('''
-            INSERT INTO bookmarks (user_id, job_title, employer_name, job_data)
-            VALUES (?, ?, ?, ?)
-        ''', (str(user_id), job.get('job_title', ''), job.get('employer_name', ''), json.dumps(job)))
+            CREATE TABLE IF NOT EXISTS result_set_jobs (
+                set_id INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                job_data BLOB NOT NULL,
+                PRIMARY KEY (set_id, position)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_result_sets_created_at ON result_sets(created_at)')
 
-        conn.commit()
-        conn.close()
-        return True
+    @staticmethod
+    def _index_history_time(cursor: sqlite3.Cursor):
+        #popularity queries scan recent history across all users
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_time ON search_history(timestamp)')
 
-    def get_bookmarks(self, user_id: int):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def _migrate_bookmarks(cursor: sqlite3.Cursor):
+        columns = [row[1] for row in cursor.execute('PRAGMA table_info(bookmarks)')]
+        if 'job_key' in columns:
+            return
 
+        #older databases store raw JSON text without a unique job key
+        cursor.execute('ALTER TABLE bookmarks RENAME TO bookmarks_old')
         cursor.execute('''
-            SELECT job_data FROM bookmarks 
-            WHERE user_id = ? 
-            ORDER BY created_at DESC
-        ''', (str(user_id),))
-
-        bookmarks = []
-        for row in cursor.fetchall():
-            try:
-                job_data = json.loads(row[0])
-                bookmarks.append(job_data)
-            except json.JSONDecodeError:
+            CREATE TABLE bookmarks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                job_key TEXT NOT NULL,
+                job_title TEXT NOT NULL,
+                employer_name TEXT NOT NULL,
+                job_data BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('DROP INDEX IF EXISTS idx_bookmarks_user_id')
+
+        rows = cursor.execute('''
+            SELECT id, user_id, job_title, employer_name, job_data, created_at
+            FROM bookmarks_old ORDER BY id
+        ''').fetchall()
+        for bookmark_id, user_id, job_title, employer_name, job_data, created_at in rows:
+            job = decode_job(job_data)
+            if job is None:
                 continue
+            cursor.execute('''
+                INSERT OR IGNORE INTO bookmarks (id, user_id, job_key, job_title, employer_name, job_data, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (bookmark_id, user_id, bookmark_key(job), job_title, employer_name, encode_job(job), created_at))
 
-        conn.close()
-        return bookmarks
+        cursor.execute('DROP TABLE bookmarks_old')
 
-    def clear_bookmarks(self, user_id: int) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    async def add_bookmark(self, user_id: int, job: Job) -> bool:
+        return await self._write(self._add_bookmark, user_id, job)
 
+    @staticmethod
+    def _add_bookmark(cursor: sqlite3.Cursor, user_id: int, job: Job) -> bool:
+        cursor.execute('''
+            INSERT OR IGNORE INTO bookmarks (user_id, job_key, job_title, employer_name, job_data)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (str(user_id), bookmark_key(job), job.job_title, job.employer_name,
+              encode_job(job)))
+
+        return cursor.rowcount == 1
+
+    async def count_bookmarks(self, user_id: int) -> int:
+        return await self._read(self._count_bookmarks, user_id)
+
+    @staticmethod
+    def _count_bookmarks(cursor: sqlite3.Cursor, user_id: int) -> int:
+        cursor.execute('SELECT COUNT(*) FROM bookmarks WHERE user_id = ?', (str(user_id),))
+        return cursor.fetchone()[0]
+
+    async def get_bookmark_page(self, user_id: int, before_id: int = None, after_id: int = None,
+                                limit: int = 10) -> List[Tuple[int, Job]]:
+        return await self._read(self._get_bookmark_page, user_id, before_id, after_id, limit)
+
+    @staticmethod
+    def _get_bookmark_page(cursor: sqlite3.Cursor, user_id: int, before_id: int = None,
+                           after_id: int = None, limit: int = 10) -> List[Tuple[int, Job]]:
+        #keyset pagination on id, newest first; only the requested page is decoded
+        if after_id is not None:
+            cursor.execute('''
+                SELECT id, job_data FROM bookmarks 
+                WHERE user_id = ? AND id > ? 
+                ORDER BY id ASC 
+                LIMIT ?
+            ''', (str(user_id), after_id, limit))
+            rows = cursor.fetchall()[::-1]
+        else:
+            cursor.execute('''
+                SELECT id, job_data FROM bookmarks 
+                WHERE user_id = ? AND id < ? 
+                ORDER BY id DESC 
+                LIMIT ?
+            ''', (str(user_id), before_id if before_id is not None else 2 ** 63 - 1, limit))
+            rows = cursor.fetchall()
+
+        page = []
+        for bookmark_id, job_data in rows:
+            job = decode_job(job_data)
+            if job is not None:
+                page.append((bookmark_id, job))
+        return page
+
+    async def get_bookmark_chunk(self, user_id: int, before_id: int = None,
+                                 limit: int = 500) -> Tuple[Optional[int], int, List[Job]]:
+        return await self._read(self._get_bookmark_chunk, user_id, before_id, limit)
+
+    @staticmethod
+    def _get_bookmark_chunk(cursor: sqlite3.Cursor, user_id: int, before_id: Optional[int],
+                            limit: int) -> Tuple[Optional[int], int, List[Job]]:
+        #(last id read, rows read, decoded jobs) newest first; paging follows the stored rows,
+        #so a row that no longer decodes is skipped without ending the scan
+        cursor.execute('''
+            SELECT id, job_data FROM bookmarks
+            WHERE user_id = ? AND id < ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (str(user_id), before_id if before_id is not None else 2 ** 63 - 1, limit))
+        rows = cursor.fetchall()
+        jobs = [job for job in (decode_job(job_data) for _bookmark_id, job_data in rows) if job is not None]
+        return (rows[-1][0] if rows else None), len(rows), jobs
+
+    async def clear_bookmarks(self, user_id: int) -> int:
+        return await self._write(self._clear_bookmarks, user_id)
+
+    @staticmethod
+    def _clear_bookmarks(cursor: sqlite3.Cursor, user_id: int) -> int:
         cursor.execute('DELETE FROM bookmarks WHERE user_id = ?', (str(user_id),))
         deleted_count = cursor.rowcount
 
-        conn.commit()
-        conn.close()
         return deleted_count
 
-    def add_search_history(self, user_id: int, query: str):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-
+    async def index_jobs(self, jobs: List[Job]):
+        if not self.job_index_enabled or not jobs:
+            return
+        await self._write(self._index_jobs, jobs, time.time())
+
+        if time.time() - self._index_expired_at > 3600:
+            self._index_expired_at = time.time()
+            await self.expire_job_index()
+
+    @staticmethod
+    def _index_jobs(cursor: sqlite3.Cursor, jobs: List[Job], indexed_at: float):
+        for job in jobs:
+            key = job.job_id or bookmark_key(job)
+            cursor.execute('''
+                INSERT INTO job_index (job_key, job_title, employer_name, job_city, min_salary, posted_at, indexed_at, job_data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(job_key) DO UPDATE SET
+                    job_title = excluded.job_title,
+                    employer_name = excluded.employer_name,
+                    job_city = excluded.job_city,
+                    min_salary = excluded.min_salary,
+                    posted_at = excluded.posted_at,
+                    indexed_at = excluded.indexed_at,
+                    job_data = excluded.job_data
+            ''', (key, job.job_title, job.employer_name, (job.job_city or '').lower(),
+                  annual_salary(job.job_min_salary, job.job_salary_period), job.job_posted_at_datetime_utc or '',
+                  indexed_at, encode_job(job)))
+
+            rowid = cursor.execute('SELECT rowid FROM job_index WHERE job_key = ?', (key,)).fetchone()[0]
+            cursor.execute('DELETE FROM job_index_fts WHERE rowid = ?', (rowid,))
+            cursor.execute('''
+                INSERT INTO job_index_fts (rowid, job_title, employer_name, job_city, job_description)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (rowid, job.job_title, job.employer_name, job.job_city or '', job.job_description))
+
+    async def search_job_index(self, query: str, location: str = "", remote_only: bool = False,
+                               min_salary: int = None, date_posted: str = "all", limit: int = 10,
+                               max_age: float = None) -> List[Job]:
+        if not self.job_index_enabled:
+            return []
+        match = fts_match_expression(query, remote_only)
+        if not match:
+            return []
+        indexed_after = time.time() - (max_age if max_age is not None else self.job_index_retention)
+        return await self._read(self._search_job_index, match, location, min_salary,
+                                posted_cutoff(date_posted), indexed_after, limit)
+
+    @staticmethod
+    def _search_job_index(cursor: sqlite3.Cursor, match: str, location: str, min_salary: int,
+                          posted_after: str, indexed_after: float, limit: int) -> List[Job]:
+        sql = '''
+            SELECT job_index.job_data FROM job_index_fts
+            JOIN job_index ON job_index.rowid = job_index_fts.rowid
+            WHERE job_index_fts MATCH ? AND job_index.indexed_at >= ?
+        '''
+        params = [match, indexed_after]
+
+        if location:
+            sql += ' AND job_index.job_city = ?'
+            params.append(location.lower())
+        if min_salary:
+            sql += ' AND (job_index.min_salary IS NULL OR job_index.min_salary >= ?)'
+            params.append(min_salary)
+        if posted_after:
+            sql += ' AND job_index.posted_at >= ?'
+            params.append(posted_after)
+
+        #titles weigh more than descriptions when ranking
+        sql += ' ORDER BY bm25(job_index_fts, 10.0, 5.0, 1.0, 1.0) LIMIT ?'
+        params.append(limit)
+
+        jobs = []
+        for row in cursor.execute(sql, params).fetchall():
+            job = decode_job(row[0])
+            if job is not None:
+                jobs.append(job)
+        return jobs
+
+    async def expire_job_index(self) -> int:
+        if not self.job_index_enabled:
+            return 0
+        return await self._write(self._expire_job_index, time.time() - self.job_index_retention)
+
+    @staticmethod
+    def _expire_job_index(cursor: sqlite3.Cursor, indexed_before: float) -> int:
+        cursor.execute('''
+            DELETE FROM job_index_fts WHERE rowid IN (
+                SELECT rowid FROM job_index WHERE indexed_at < ?
+            )
+        ''', (indexed_before,))
+        cursor.execute('DELETE FROM job_index WHERE indexed_at < ?', (indexed_before,))
+        return cursor.rowcount
+
+    async def create_result_set(self, user_id: int, jobs: List[Job]) -> int:
+        set_id = await self._write(self._create_result_set, user_id, jobs, time.time())
+
+        if time.time() - self._result_sets_expired_at > 3600:
+            self._result_sets_expired_at = time.time()
+            await self._write(self._expire_result_sets, time.time() - self.result_set_retention)
+        return set_id
+
+    @staticmethod
+    def _create_result_set(cursor: sqlite3.Cursor, user_id: int, jobs: List[Job], created_at: float) -> int:
+        cursor.execute('INSERT INTO result_sets (user_id, total, created_at) VALUES (?, ?, ?)',
+                       (str(user_id), len(jobs), created_at))
+        set_id = cursor.lastrowid
+        cursor.executemany('INSERT INTO result_set_jobs (set_id, position, job_data) VALUES (?, ?, ?)',
+                           [(set_id, position, encode_job(job)) for position, job in enumerate(jobs)])
+        return set_id
+
+    async def extend_result_set(self, set_id: int, jobs: List[Job], start: int):
+        #streamed searches append later pages to the set the message already points at
+        await self._write(self._extend_result_set, set_id, jobs, start)
+
+    @staticmethod
+    def _extend_result_set(cursor: sqlite3.Cursor, set_id: int, jobs: List[Job], start: int):
+        cursor.executemany('INSERT OR REPLACE INTO result_set_jobs (set_id, position, job_data) VALUES (?, ?, ?)',
+                           [(set_id, start + offset, encode_job(job)) for offset, job in enumerate(jobs)])
+        cursor.execute('UPDATE result_sets SET total = MAX(total, ?) WHERE id = ?', (start + len(jobs), set_id))
+
+    async def get_result_job(self, set_id: int, position: int, step: int = 0) -> Optional[Tuple[int, int, Job]]:
+        return await self._read(self._get_result_job, set_id, position, step)
+
+    @staticmethod
+    def _get_result_job(cursor: sqlite3.Cursor, set_id: int, position: int,
+                        step: int) -> Optional[Tuple[int, int, Job]]:
+        #(position, total, job) for the job `step` places from `position`, None once the set has expired
+        row = cursor.execute('SELECT total FROM result_sets WHERE id = ?', (set_id,)).fetchone()
+        if row is None or not row[0]:
+            return None
+        total = row[0]
+        position = (position + step) % total
+
+        row = cursor.execute('SELECT job_data FROM result_set_jobs WHERE set_id = ? AND position = ?',
+                             (set_id, position)).fetchone()
+        job = decode_job(row[0]) if row else None
+        if job is None:
+            return None
+        return position, total, job
+
+    @staticmethod
+    def _expire_result_sets(cursor: sqlite3.Cursor, created_before: float) -> int:
         cursor.execute('''
-            INSERT INTO search_history (user_id, query)
-            VALUES (?, ?)
-        ''', (str(user_id), query))
+            DELETE FROM result_set_jobs WHERE set_id IN (
+                SELECT id FROM result_sets WHERE created_at < ?
+            )
+        ''', (created_before,))
+        cursor.execute('DELETE FROM result_sets WHERE created_at < ?', (created_before,))
+        return cursor.rowcount
+
+    async def get_recent_jobs(self, scope: str, limit: int) -> List[Job]:
+        return await self._read(self._get_recent_jobs, scope, limit)
 
+    @staticmethod
+    def _get_recent_jobs(cursor: sqlite3.Cursor, scope: str, limit: int) -> List[Job]:
+        cursor.execute('''
+            SELECT job_data FROM recent_jobs
+            WHERE scope = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (scope, limit))
+        jobs = [decode_job(row[0]) for row in cursor.fetchall()[::-1]]
+        return [job for job in jobs if job is not None]
+
+    async def get_recent_scopes(self, limit: int) -> List[str]:
+        return await self._read(self._get_recent_scopes, limit)
+
+    @staticmethod
+    def _get_recent_scopes(cursor: sqlite3.Cursor, limit: int) -> List[str]:
+        #channels with the newest results first
+        cursor.execute('''
+            SELECT scope FROM recent_jobs
+            GROUP BY scope
+            ORDER BY MAX(id) DESC
+            LIMIT ?
+        ''', (limit,))
+        return [row[0] for row in cursor.fetchall()]
+
+    async def add_recent_jobs(self, scope: str, jobs: List[Job], keep: int):
+        await self._write(self._add_recent_jobs, scope, jobs, keep)
+
+    @staticmethod
+    def _add_recent_jobs(cursor: sqlite3.Cursor, scope: str, jobs: List[Job], keep: int):
+        cursor.executemany('INSERT INTO recent_jobs (scope, job_data) VALUES (?, ?)',
+                           [(scope, encode_job(job)) for job in jobs])
         cursor.execute('''
-            DELETE FROM search_history 
-            WHERE user_id = ? AND id NOT IN (
-                SELECT id FROM search_history 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT 10
+            DELETE FROM recent_jobs
+            WHERE scope = ? AND id <= (
+                SELECT id FROM recent_jobs WHERE scope = ? ORDER BY id DESC LIMIT 1 OFFSET ?
             )
-        ''', (str(user_id), str(user_id)))
+        ''', (scope, scope, keep))
 
-        conn.commit()
-        conn.close()
+    async def add_alert(self, user_id: int, guild_id: Optional[int], channel_id: int,
+                        raw_query: str, query_key: str) -> int:
+        return await self._write(self._add_alert, user_id, guild_id, channel_id, raw_query, query_key)
 
-    def get_search_history(self, user_id: int) -> List[Dict]:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def _add_alert(cursor: sqlite3.Cursor, user_id: int, guild_id: Optional[int], channel_id: int,
+                   raw_query: str, query_key: str) -> int:
+        cursor.execute('''
+            INSERT INTO alerts (user_id, guild_id, channel_id, raw_query, query_key)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (str(user_id), str(guild_id) if guild_id else None, str(channel_id), raw_query, query_key))
+        return cursor.lastrowid
+
+    async def get_user_alerts(self, user_id: int) -> List[Dict]:
+        return await self._read(self._get_user_alerts, user_id)
+
+    @staticmethod
+    def _get_user_alerts(cursor: sqlite3.Cursor, user_id: int) -> List[Dict]:
+        cursor.execute('''
+            SELECT id, raw_query, channel_id, created_at FROM alerts 
+            WHERE user_id = ? 
+            ORDER BY id
+        ''', (str(user_id),))
+        return [
+            {'id': row[0], 'raw_query': row[1], 'channel_id': row[2], 'created_at': row[3]}
+            for row in cursor.fetchall()
+        ]
+
+    async def get_all_alerts(self) -> List[Dict]:
+        return await self._read(self._get_all_alerts)
 
+    @staticmethod
+    def _get_all_alerts(cursor: sqlite3.Cursor) -> List[Dict]:
+        cursor.execute('''
+            SELECT id, user_id, channel_id, raw_query, query_key, last_checked, guild_id FROM alerts 
+            ORDER BY query_key, id
+        ''')
+        return [
+            {'id': row[0], 'user_id': row[1], 'channel_id': row[2], 'raw_query': row[3],
+             'query_key': row[4], 'last_checked': row[5], 'guild_id': row[6]}
+            for row in cursor.fetchall()
+        ]
+
+    async def remove_alerts(self, user_id: int, alert_id: int = None) -> int:
+        return await self._write(self._remove_alerts, user_id, alert_id)
+
+    @staticmethod
+    def _remove_alerts(cursor: sqlite3.Cursor, user_id: int, alert_id: int = None) -> int:
+        if alert_id is None:
+            cursor.execute('SELECT id FROM alerts WHERE user_id = ?', (str(user_id),))
+        else:
+            cursor.execute('SELECT id FROM alerts WHERE user_id = ? AND id = ?', (str(user_id), alert_id))
+        alert_ids = [(row[0],) for row in cursor.fetchall()]
+
+        cursor.executemany('DELETE FROM alert_seen WHERE alert_id = ?', alert_ids)
+        cursor.executemany('DELETE FROM alerts WHERE id = ?', alert_ids)
+        return len(alert_ids)
+
+    async def get_unseen_jobs(self, alert_ids: List[int], job_hashes: List[int]) -> Dict[int, set]:
+        return await self._read(self._get_unseen_jobs, alert_ids, job_hashes)
+
+    @staticmethod
+    def _get_unseen_jobs(cursor: sqlite3.Cursor, alert_ids: List[int], job_hashes: List[int]) -> Dict[int, set]:
+        unseen = {alert_id: set(job_hashes) for alert_id in alert_ids}
+        if not alert_ids or not job_hashes:
+            return unseen
+
+        #one probe of the (alert_id, job_hash) key for the whole group
+        cursor.execute(f'''
+            SELECT alert_id, job_hash FROM alert_seen 
+            WHERE alert_id IN ({','.join('?' * len(alert_ids))}) 
+            AND job_hash IN ({','.join('?' * len(job_hashes))})
+        ''', (*alert_ids, *job_hashes))
+        for alert_id, job_hash in cursor.fetchall():
+            unseen[alert_id].discard(job_hash)
+        return unseen
+
+    async def mark_alerts_seen(self, seen: List[Tuple[int, int]], alert_ids: List[int]):
+        await self._write(self._mark_alerts_seen, seen, alert_ids, time.time())
+
+    @staticmethod
+    def _mark_alerts_seen(cursor: sqlite3.Cursor, seen: List[Tuple[int, int]], alert_ids: List[int],
+                          checked_at: float):
+        cursor.executemany('''
+            INSERT OR REPLACE INTO alert_seen (alert_id, job_hash, seen_at)
+            VALUES (?, ?, ?)
+        ''', [(alert_id, job_hash, checked_at) for alert_id, job_hash in seen])
+        cursor.executemany('UPDATE alerts SET last_checked = ? WHERE id = ?',
+                           [(checked_at, alert_id) for alert_id in alert_ids])
+
+        #postings missing from every check for a month won't come back in results, forget them
+        cursor.execute('DELETE FROM alert_seen WHERE seen_at < ?', (checked_at - 30 * 24 * 3600,))
+
+    async def add_search_history(self, user_id: int, query: str):
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+        self._pending_history.append((str(user_id), query, timestamp))
+
+        if len(self._pending_history) >= self.history_batch_size:
+            self._start_history_flush()
+        elif self._history_timer is None:
+            loop = asyncio.get_running_loop()
+            self._history_timer = loop.call_later(self.history_flush_interval, self._start_history_flush)
+
+    def _start_history_flush(self):
+        if self._history_timer is not None:
+            self._history_timer.cancel()
+            self._history_timer = None
+        if self._history_flush_task is None or self._history_flush_task.done():
+            self._history_flush_task = asyncio.ensure_future(self._flush_history_in_background())
+
+    async def _flush_history_in_background(self):
+        try:
+            await self.flush_search_history()
+        except Exception as e:
+            print(f"Search history flush failed: {e}")
+            #the batch went back in the queue, retry on the next interval
+            if self._history_timer is None:
+                loop = asyncio.get_running_loop()
+                self._history_timer = loop.call_later(self.history_flush_interval, self._start_history_flush)
+
+    async def flush_search_history(self):
+        async with self._history_flush_lock:
+            while self._pending_history:
+                batch = self._pending_history
+                self._pending_history = []
+                self._flushing_history = batch
+                try:
+                    await self._write(self._write_history_batch, batch)
+                except Exception:
+                    self._pending_history = batch + self._pending_history
+                    raise
+                finally:
+                    self._flushing_history = []
+
+    @staticmethod
+    def _write_history_batch(cursor: sqlite3.Cursor, batch: List[tuple]):
+        cursor.executemany('''
+            INSERT INTO search_history (user_id, query, timestamp)
+            VALUES (?, ?, ?)
+        ''', batch)
+
+        #one trim per user per batch instead of one per search
+        for user_id in {entry[0] for entry in batch}:
+            cursor.execute('''
+                DELETE FROM search_history 
+                WHERE user_id = ? AND id NOT IN (
+                    SELECT id FROM search_history 
+                    WHERE user_id = ? 
+                    ORDER BY timestamp DESC 
+                    LIMIT 10
+                )
+            ''', (user_id, user_id))
+
+    def _queued_history(self, user_id: str) -> List[Dict]:
+        return [
+            {'query': query, 'timestamp': timestamp}
+            for uid, query, timestamp in self._flushing_history + self._pending_history
+            if uid == user_id
+        ]
+
+    def _drop_queued_history(self, user_id: str):
+        self._pending_history = [entry for entry in self._pending_history if entry[0] != user_id]
+
+    async def get_search_history(self, user_id: int) -> List[Dict]:
+        history = await self._read(self._get_search_history, user_id)
+
+        #entries still waiting for a group commit show up straight away
+        queued = self._queued_history(str(user_id))
+        if queued:
+            seen = {(entry['query'], entry['timestamp']) for entry in history}
+            history += [entry for entry in queued if (entry['query'], entry['timestamp']) not in seen]
+            history.sort(key=lambda entry: entry['timestamp'], reverse=True)
+        return history[:10]
+
+    @staticmethod
+    def _get_search_history(cursor: sqlite3.Cursor, user_id: int) -> List[Dict]:
         cursor.execute('''
             SELECT query, timestamp FROM search_history 
             WHERE user_id = ? 
@@ -133,32 +835,66 @@ class DatabaseManager:
                 'timestamp': row[1]
             })
 
-        conn.close()
         return history
 
-    def clear_search_history(self, user_id: int) -> int:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    async def get_popular_queries(self, limit: int = 20, days: int = 7) -> List[Tuple[str, int]]:
+        await self.flush_search_history()
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        return await self._read(self._get_popular_queries, since, limit)
 
+    @staticmethod
+    def _get_popular_queries(cursor: sqlite3.Cursor, since: str, limit: int) -> List[Tuple[str, int]]:
+        cursor.execute('''
+            SELECT MIN(query), COUNT(*) AS uses FROM search_history
+            WHERE timestamp >= ?
+            GROUP BY LOWER(TRIM(query))
+            ORDER BY uses DESC
+            LIMIT ?
+        ''', (since, limit))
+        return cursor.fetchall()
+
+    async def get_query_hours(self, days: int = 14, limit: int = 5000) -> List[Tuple[str, int, int]]:
+        #(query, hour of day in UTC, uses) for the busiest query and hour pairs
+        await self.flush_search_history()
+        since = (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+        return await self._read(self._get_query_hours, since, limit)
+
+    @staticmethod
+    def _get_query_hours(cursor: sqlite3.Cursor, since: str, limit: int) -> List[Tuple[str, int, int]]:
+        cursor.execute('''
+            SELECT MIN(query), CAST(strftime('%H', timestamp) AS INTEGER) AS hour, COUNT(*) AS uses
+            FROM search_history
+            WHERE timestamp >= ?
+            GROUP BY LOWER(TRIM(query)), hour
+            ORDER BY uses DESC
+            LIMIT ?
+        ''', (since, limit))
+        return cursor.fetchall()
+
+    async def clear_search_history(self, user_id: int) -> int:
+        self._drop_queued_history(str(user_id))
+        await self.flush_search_history()
+        return await self._write(self._clear_search_history, user_id)
+
+    @staticmethod
+    def _clear_search_history(cursor: sqlite3.Cursor, user_id: int) -> int:
         cursor.execute('DELETE FROM search_history WHERE user_id = ?', (str(user_id),))
         deleted_count = cursor.rowcount
 
-        conn.commit()
-        conn.close()
         return deleted_count
 
-    def clear_all_user_data(self, user_id: int) -> tuple:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    async def clear_all_user_data(self, user_id: int) -> tuple:
+        self._drop_queued_history(str(user_id))
+        await self.flush_search_history()
+        return await self._write(self._clear_all_user_data, user_id)
 
+    @staticmethod
+    def _clear_all_user_data(cursor: sqlite3.Cursor, user_id: int) -> tuple:
         cursor.execute('DELETE FROM bookmarks WHERE user_id = ?', (str(user_id),))
         bookmarks_deleted = cursor.rowcount
 
         cursor.execute('DELETE FROM search_history WHERE user_id = ?', (str(user_id),))
         history_deleted = cursor.rowcount
 
-        conn.commit()
-        conn.close()
         return bookmarks_deleted, history_deleted
 
-
@@ -0,0 +1,144 @@
+import hashlib
+import re
+from functools import lru_cache
+from itertools import combinations
+from typing import Iterable, List
+from models import Job
+
+#max differing bits between two fingerprints of the same posting
+DEFAULT_THRESHOLD = 8
+
+_NON_WORD = re.compile(r'[^a-z0-9]+')
+#boards decorate the same posting with these, they say nothing about which job it is
+NOISE_WORDS = frozenset((
+    'inc', 'llc', 'ltd', 'corp', 'co', 'the', 'remote', 'hybrid', 'onsite', 'apply', 'now', 'full', 'part',
+    'time', 'urgent', 'hiring', 'new', 'ii', 'iii'
+))
+#only the start of a description is shingled, syndicated copies diverge in their footers
+DESCRIPTION_WORDS = 120
+
+
+def normalize(text: str) -> List[str]:
+    return [word for word in _NON_WORD.sub(' ', text.lower()).split() if word not in NOISE_WORDS]
+
+
+#_SPREAD[i][byte] puts each bit of the i-th hash byte into its own 16-bit lane, so summing spread
+#hashes adds all 64 per-bit counters at once with plain int addition
+_LANE_BITS = 16
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_SPREAD = [
+    [sum(1 << (_LANE_BITS * (8 * i + bit)) for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+    for i in range(8)
+]
+
+
+#title words, employers and the shingles of syndicated copies repeat constantly
+@lru_cache(maxsize=32768)
+def _spread_hash(feature: str) -> int:
+    d = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+    s = _SPREAD
+    return s[0][d[0]] | s[1][d[1]] | s[2][d[2]] | s[3][d[3]] | s[4][d[4]] | s[5][d[5]] | s[6][d[6]] | s[7][d[7]]
+
+
+def simhash(weighted_features: Iterable) -> int:
+    counters = 0
+    total = 0
+    for feature, weight in weighted_features:
+        counters += _spread_hash(feature) * weight
+        total += weight
+
+    fingerprint = 0
+    half = total / 2
+    for bit in range(64):
+        if (counters >> (_LANE_BITS * bit)) & _LANE_MASK > half:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def job_features(job: Job):
+    title = normalize(job.job_title)
+    employer = normalize(job.employer_name)
+    #roughly DESCRIPTION_WORDS words, normalizing a full 4000 character description dominates the cost
+    words = normalize(job.job_description[:DESCRIPTION_WORDS * 10])[:DESCRIPTION_WORDS]
+
+    for word in title:
+        yield 't:' + word, 3
+    for first, second in zip(title, title[1:]):
+        yield 't:' + first + ' ' + second, 2
+    for word in employer:
+        yield 'e:' + word, 3
+    for i in range(len(words) - 2):
+        yield 'd:' + ' '.join(words[i:i + 3]), 1
+
+
+def fingerprint(job: Job) -> int:
+    #memoized on the record, jobs are compared across pages, cache hits and .recent
+    if job.fingerprint is None:
+        job.fingerprint = simhash(job_features(job))
+    return job.fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+#narrowest band key; with 2**21 buckets per table a bucket holds about n / 2M fingerprints, so even
+#with the ~700 probes per lookup a lookup compares against a handful of candidates at 100k jobs
+MIN_BAND_BITS = 21
+
+
+class NearDuplicateDetector:
+    def __init__(self, threshold: int = DEFAULT_THRESHOLD):
+        #split the 64 bits into bands of at least MIN_BAND_BITS; two fingerprints within the threshold
+        #differ in at most threshold // bands bits of some band, so each lookup probes every key within
+        #that radius of its own band keys (multi-probe LSH) instead of scanning crowded narrow buckets
+        self.threshold = threshold
+        bands = max(1, min(threshold + 1, 64 // MIN_BAND_BITS))
+        self.radius = threshold // bands
+        self._bands = [(i * 64 // bands, (i + 1) * 64 // bands) for i in range(bands)]
+        self._probes = [self._probe_masks(end - start, self.radius) for start, end in self._bands]
+        self._tables = [dict() for _ in self._bands]
+        self._exact = set()
+        self.comparisons = 0
+
+    @staticmethod
+    def _probe_masks(width: int, radius: int) -> List[int]:
+        masks = []
+        for flipped in range(radius + 1):
+            for bits in combinations(range(width), flipped):
+                masks.append(sum(1 << bit for bit in bits))
+        return masks
+
+    def _band_keys(self, value: int):
+        for start, end in self._bands:
+            yield (value >> start) & ((1 << (end - start)) - 1)
+
+    def contains(self, value: int) -> bool:
+        if value in self._exact:
+            return True
+        for table, probes, key in zip(self._tables, self._probes, self._band_keys(value)):
+            for mask in probes:
+                candidates = table.get(key ^ mask)
+                if candidates is None:
+                    continue
+                for candidate in candidates:
+                    self.comparisons += 1
+                    if hamming(candidate, value) <= self.threshold:
+                        return True
+        return False
+
+    def add(self, value: int):
+        self._exact.add(value)
+        for table, key in zip(self._tables, self._band_keys(value)):
+            table.setdefault(key, []).append(value)
+
+    def add_job(self, job: Job) -> bool:
+        #True if the job is new, False if it's a near duplicate of one already added
+        value = fingerprint(job)
+        if self.contains(value):
+            return False
+        self.add(value)
+        return True
+
+    def filter(self, jobs: Iterable[Job]) -> List[Job]:
+        return [job for job in jobs if self.add_job(job)]
@@ -0,0 +1,84 @@
+import asyncio
+import csv
+import gzip
+import json
+import os
+import tempfile
+from typing import List, Tuple
+from metrics import metrics
+from models import Job
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+#text starting with these runs as a formula when a csv is opened in a spreadsheet
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    #job data comes from third parties, so text cells are never allowed to start a formula
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class BookmarkExport:
+    #an incremental encoder writing straight into a gzip file, so only one chunk of rows
+    #is ever held in memory however many bookmarks the user has
+    def __init__(self, fmt: str):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {fmt}")
+        self.fmt = fmt
+        self.rows = 0
+        #bookmarks whose stored data could not be decoded
+        self.skipped = 0
+
+        handle, self.path = tempfile.mkstemp(prefix='saved_jobs_', suffix=f'.{fmt}.gz')
+        os.close(handle)
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8', newline='')
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(Job.FIELDS)
+
+    def write_chunk(self, jobs: List[Job]):
+        for job in jobs:
+            if self._csv is not None:
+                self._csv.writerow([_csv_cell(getattr(job, field)) for field in Job.FIELDS])
+            else:
+                self._file.write(json.dumps(job.to_dict(), separators=(',', ':')))
+                self._file.write('\n')
+        self.rows += len(jobs)
+
+    def close(self) -> int:
+        self._file.close()
+        return os.path.getsize(self.path)
+
+    def discard(self):
+        if not self._file.closed:
+            self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def export_bookmarks(db, user_id: int, fmt: str, chunk_size: int = 500) -> Tuple[BookmarkExport, int]:
+    #returns the finished export and its compressed size; the caller uploads and discards it
+    loop = asyncio.get_running_loop()
+    export = BookmarkExport(fmt)
+    try:
+        with metrics.span('bookmark_export'):
+            before_id = None
+            while True:
+                #keyset pages run on the reader pool, encoding and compression on the default executor
+                last_id, read, jobs = await db.get_bookmark_chunk(user_id, before_id, chunk_size)
+                if not read:
+                    break
+                export.skipped += read - len(jobs)
+                await loop.run_in_executor(None, export.write_chunk, jobs)
+                before_id = last_id
+            size = await loop.run_in_executor(None, export.close)
+    except BaseException:
+        export.discard()
+        raise
+    metrics.inc('bookmark_exports', format=fmt)
+    return export, size
@@ -0,0 +1,113 @@
+import re
+from datetime import datetime, timedelta
+from typing import Callable, FrozenSet, NamedTuple, Optional
+from models import Job
+
+#multipliers that turn a JSearch salary into a yearly figure
+SALARY_PERIODS = {
+    'HOUR': 2080,
+    'DAY': 260,
+    'WEEK': 52,
+    'MONTH': 12,
+    'YEAR': 1
+}
+#accepted spellings for --type, mapped to JSearch employment types
+EMPLOYMENT_TYPES = {
+    'fulltime': 'FULLTIME',
+    'full-time': 'FULLTIME',
+    'parttime': 'PARTTIME',
+    'part-time': 'PARTTIME',
+    'contract': 'CONTRACTOR',
+    'contractor': 'CONTRACTOR',
+    'intern': 'INTERN',
+    'internship': 'INTERN'
+}
+
+_REMOTE = re.compile(r'\bremote\b', re.IGNORECASE)
+
+
+class FilterSpec(NamedTuple):
+    remote_only: bool = False
+    min_salary: Optional[int] = None
+    max_salary: Optional[int] = None
+    employment_types: FrozenSet[str] = frozenset()
+    exclude_keywords: FrozenSet[str] = frozenset()
+    exclude_employers: FrozenSet[str] = frozenset()
+    max_age_days: Optional[int] = None
+
+
+def annual_salary(amount: Optional[float], period: Optional[str]) -> Optional[float]:
+    if amount is None:
+        return None
+    return amount * SALARY_PERIODS.get((period or 'YEAR').upper(), 1)
+
+
+def _is_valid(job: Job) -> bool:
+    return bool(job.job_title and job.employer_name)
+
+
+def _word_pattern(words: FrozenSet[str]):
+    #one alternation per spec instead of a substring scan per word
+    alternatives = '|'.join(re.escape(word) for word in sorted(words, key=len, reverse=True))
+    #lookarounds rather than \b, which never matches around words like c++, c# or .net
+    return re.compile(rf'(?<!\w)(?:{alternatives})(?!\w)', re.IGNORECASE)
+
+
+def compile_filter(spec: FilterSpec) -> Callable[[Job], bool]:
+    #built once per search and reused for every page and cached result it filters
+    #checks are ordered cheapest first: field lookups, then string compares, then regex over text
+    checks = [_is_valid]
+
+    if spec.employment_types:
+        types = spec.employment_types
+        checks.append(lambda job: job.job_employment_type in types)
+
+    if spec.min_salary:
+        min_salary = spec.min_salary
+
+        def above_min(job: Job) -> bool:
+            #jobs without a listed salary are kept, as before
+            salary = annual_salary(job.job_min_salary, job.job_salary_period)
+            return salary is None or salary >= min_salary
+        checks.append(above_min)
+
+    if spec.max_salary:
+        max_salary = spec.max_salary
+
+        def below_max(job: Job) -> bool:
+            salary = annual_salary(job.job_min_salary, job.job_salary_period)
+            return salary is None or salary <= max_salary
+        checks.append(below_max)
+
+    if spec.max_age_days:
+        #ISO timestamps compare correctly as strings
+        cutoff = (datetime.utcnow() - timedelta(days=spec.max_age_days)).strftime('%Y-%m-%dT%H:%M:%S')
+        checks.append(lambda job: not job.job_posted_at_datetime_utc or job.job_posted_at_datetime_utc >= cutoff)
+
+    if spec.exclude_employers:
+        employers = _word_pattern(spec.exclude_employers)
+        checks.append(lambda job: not employers.search(job.employer_name))
+
+    if spec.remote_only:
+        def is_remote(job: Job) -> bool:
+            #JSearch's own flag settles it, the text scan is only for records saved without one
+            if job.job_is_remote is not None:
+                return job.job_is_remote
+            return bool(_REMOTE.search(job.job_title) or _REMOTE.search(job.job_description))
+        checks.append(is_remote)
+
+    if spec.exclude_keywords:
+        keywords = _word_pattern(spec.exclude_keywords)
+        checks.append(lambda job: not (keywords.search(job.job_title) or keywords.search(job.job_description)))
+
+    if len(checks) == 1:
+        return checks[0]
+
+    checks = tuple(checks)
+
+    def predicate(job: Job) -> bool:
+        for check in checks:
+            if not check(job):
+                return False
+        return True
+    return predicate
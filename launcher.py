@@ -0,0 +1,57 @@
+import argparse
+import os
+import signal
+import subprocess
+import sys
+from typing import List, Tuple
+
+
+def shard_ranges(shard_count: int, processes: int) -> List[Tuple[int, int]]:
+    #contiguous ranges, the first processes take one extra shard when it doesn't divide evenly
+    per_process, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+    for i in range(processes):
+        size = per_process + (1 if i < extra else 0)
+        ranges.append((start, start + size - 1))
+        start += size
+    return ranges
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several shard processes on one host")
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--shard-count', type=int, required=True)
+    parser.add_argument('--shared-store', default=os.getenv('SHARED_STORE_PATH', 'job_bot_shared.db'))
+    args = parser.parse_args()
+
+    processes = max(1, min(args.processes, args.shard_count))
+    metrics_port = os.getenv('METRICS_PORT')
+    main_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+    children = []
+    for i, (first, last) in enumerate(shard_ranges(args.shard_count, processes)):
+        env = dict(os.environ, SHARD_IDS=f"{first}-{last}", SHARD_COUNT=str(args.shard_count),
+                   SHARED_STORE_PATH=args.shared_store)
+        if metrics_port:
+            #every process exports its own metrics on consecutive ports
+            env['METRICS_PORT'] = str(int(metrics_port) + i)
+        print(f"Starting shards {first}-{last} of {args.shard_count}")
+        children.append(subprocess.Popen([sys.executable, main_path], env=env))
+
+    def stop(signum, _frame):
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signum)
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    exit_code = 0
+    for child in children:
+        exit_code = child.wait() or exit_code
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
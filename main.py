@@ -1,35 +1,154 @@
+import asyncio
 import discord
 from discord.ext import commands
 import os
+import time
 from database import DatabaseManager
 from components import RapidAPIJobScraper
+from ratelimit import RequestScheduler
+from metrics import metrics
 from dotenv import load_dotenv
-from commands import setup_commands
+from commands import parse_job_command, setup_commands
+from alerts import AlertScheduler, setup_alert_commands
+from recent import RecentJobsStore
+from prefetch import PrefetchScheduler
+from shared import SharedStore
+from admission import AdmissionController
+from typing import List, Optional
 
 
-load_dotenv()
-intents = discord.Intents.default()
-intents.message_content = True
-bot = commands.Bot(command_prefix='.', intents=intents, help_command=None)
+class JobBot(commands.AutoShardedBot):
+    def __init__(self, job_scraper: RapidAPIJobScraper, db: DatabaseManager, recent_jobs: RecentJobsStore,
+                 shared_store: Optional[SharedStore] = None, started: float = None, **kwargs):
+        super().__init__(**kwargs)
+        self.job_scraper = job_scraper
+        self.db = db
+        self.recent_jobs = recent_jobs
+        self.shared_store = shared_store
+        self.metrics_runner = None
+        self.alert_scheduler = AlertScheduler(self, db, job_scraper,
+                                              interval=float(os.getenv('ALERT_INTERVAL_SECONDS', '900')))
+        self.prefetch_scheduler = PrefetchScheduler(self, db, job_scraper,
+                                                    top_n=int(os.getenv('PREFETCH_TOP_N', '10')),
+                                                    budget_per_hour=int(os.getenv('PREFETCH_BUDGET_PER_HOUR', '60')))
 
-recent_jobs = []
-db = DatabaseManager()
+        #seconds spent in each startup phase, reported once the bot is ready
+        self.startup_times = {}
+        self._phase_started = started if started is not None else time.perf_counter()
+        metrics.register_gauges('startup_seconds', lambda: dict(self.startup_times))
 
-white = 0xffffff
-red = 0xff0000
-green = 0x00ff00
+    def mark_startup_phase(self, phase: str):
+        now = time.perf_counter()
+        self.startup_times[phase] = now - self._phase_started
+        self._phase_started = now
 
-job_scraper = RapidAPIJobScraper(os.getenv('RAPIDAPI_KEY'))
+    async def setup_hook(self):
+        #runs after login and before the gateway connects, so on_ready finds caches already warm
+        self.mark_startup_phase('login')
+        try:
+            await asyncio.wait_for(self.warm_up(), float(os.getenv('WARMUP_TIMEOUT_SECONDS', '10')))
+        except Exception as e:
+            print(f"Warm-up incomplete: {e!r}")
+        self.mark_startup_phase('warmup')
 
-setup_commands(bot, db, job_scraper, recent_jobs, (red, white, green))
+        self.alert_scheduler.start()
+        if self.prefetch_scheduler.top_n > 0:
+            self.prefetch_scheduler.start()
 
+        metrics_port = os.getenv('METRICS_PORT')
+        if metrics_port:
+            metrics_host = os.getenv('METRICS_HOST', '127.0.0.1')
+            self.metrics_runner = await metrics.start_server(metrics_host, int(metrics_port))
+            print(f"Metrics available on {metrics_host}:{metrics_port}/metrics")
 
-@bot.event
-async def on_ready():
-    print(f'{bot.user} is ready')
+    async def warm_up(self, popular_queries: int = 20, channels: int = 100):
+        queries = await self.db.get_popular_queries(popular_queries)
+        warmed_queries, warmed_channels = await asyncio.gather(
+            self.job_scraper.warm([parse_job_command(query) for query, _uses in queries]),
+            self.recent_jobs.warm(channels)
+        )
+        print(f"Warmed {warmed_queries}/{len(queries)} popular searches from stored pages "
+              f"and {warmed_channels} channels")
+
+    async def on_ready(self):
+        print(f'{self.user} is ready')
+        #on_ready fires again after reconnects, only the first one ends startup
+        if 'gateway' not in self.startup_times:
+            self.mark_startup_phase('gateway')
+            phases = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.startup_times.items())
+            print(f"Startup took {sum(self.startup_times.values()):.2f}s ({phases}), "
+                  f"schema v{self.db.schema_version_at_start}")
+
+    async def close(self):
+        await self.alert_scheduler.stop()
+        await self.prefetch_scheduler.stop()
+        await self.job_scraper.close()
+        await self.db.close()
+        if self.shared_store is not None:
+            await self.shared_store.close()
+        if self.metrics_runner is not None:
+            await self.metrics_runner.cleanup()
+        await super().close()
+
+
+def parse_shard_ids(value: Optional[str]) -> Optional[List[int]]:
+    #"0-3" or "0,2,5"; unset lets discord.py run every shard in this process
+    if not value:
+        return None
+    shard_ids = []
+    for part in value.split(','):
+        start, _, end = part.strip().partition('-')
+        shard_ids.extend(range(int(start), int(end or start) + 1))
+    return shard_ids
+
+
+def create_bot(started: float = None) -> JobBot:
+    #everything is built here rather than at import time, so importing main is cheap
+    intents = discord.Intents.default()
+    intents.message_content = True
+
+    #several processes may each run a range of shards, they coordinate through the shared store
+    shard_ids = parse_shard_ids(os.getenv('SHARD_IDS'))
+    shard_count = int(os.getenv('SHARD_COUNT')) if os.getenv('SHARD_COUNT') else None
+    #API pages always go through the shared store file, so after a restart popular searches are
+    #warmed from it; the rate budget is only shared when other processes may use it too
+    shared_store = SharedStore(os.getenv('SHARED_STORE_PATH', 'job_bot_shared.db'))
+    share_budget = shard_ids is not None or bool(os.getenv('SHARED_STORE_PATH'))
+
+    db = DatabaseManager()
+
+    white = 0xffffff
+    red = 0xff0000
+    green = 0x00ff00
+
+    job_scraper = RapidAPIJobScraper(
+        os.getenv('RAPIDAPI_KEY'),
+        base_url=os.getenv('RAPIDAPI_BASE_URL', 'https://jsearch.p.rapidapi.com'),
+        job_index=db,
+        per_host_limit=int(os.getenv('RAPIDAPI_MAX_CONNECTIONS', '10')),
+        scheduler=RequestScheduler(
+            rate=float(os.getenv('RAPIDAPI_RATE_PER_SECOND', '5')),
+            burst=int(os.getenv('RAPIDAPI_BURST', '5')),
+            shared=shared_store if share_budget else None
+        ),
+        shared_store=shared_store
+    )
+    recent_jobs = RecentJobsStore(db, near_duplicate_threshold=job_scraper.near_duplicate_threshold)
+    bot = JobBot(job_scraper, db, recent_jobs, shared_store, command_prefix='.', intents=intents,
+                 started=started, help_command=None, shard_ids=shard_ids, shard_count=shard_count)
+
+    admission = AdmissionController(
+        max_active=int(os.getenv('MAX_ACTIVE_SEARCHES', '8')),
+        per_guild=int(os.getenv('MAX_SEARCHES_PER_GUILD', '3')),
+        max_queued=int(os.getenv('MAX_QUEUED_SEARCHES', '50'))
+    )
+    setup_commands(bot, db, job_scraper, recent_jobs, (red, white, green), admission)
+    setup_alert_commands(bot, db, (red, white, green))
+    return bot
 
 
 if __name__ == "__main__":
+    load_dotenv()
     discord_token = os.getenv('DISCORD_TOKEN')
     rapidapi_key = os.getenv('RAPIDAPI_KEY')
 
@@ -41,4 +160,6 @@ if __name__ == "__main__":
         exit(1)
 
     print("Starting Job Search Bot")
+    bot = create_bot(started=time.perf_counter())
+    bot.mark_startup_phase('construct')
     bot.run(discord_token)
\ No newline at end of file
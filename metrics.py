@@ -0,0 +1,116 @@
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from aiohttp import web
+
+
+class Metrics:
+    def __init__(self, window: int = 1000, prefix: str = 'jobbot'):
+        self.window = window
+        self.prefix = prefix
+
+        #(name, sorted label items) -> value
+        self.counters = defaultdict(int)
+        #stage -> last `window` durations in seconds, plus lifetime count and sum
+        self.samples = {}
+        self.totals = defaultdict(lambda: [0, 0.0])
+        #name -> callable returning {field: value}, read at export time
+        self.gauges = {}
+
+    def inc(self, name: str, amount: int = 1, **labels):
+        self.counters[(name, tuple(sorted(labels.items())))] += amount
+
+    def observe(self, stage: str, seconds: float):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = deque(maxlen=self.window)
+        samples.append(seconds)
+        totals = self.totals[stage]
+        totals[0] += 1
+        totals[1] += seconds
+
+    @contextmanager
+    def span(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def register_gauges(self, name: str, fn: Callable[[], Dict[str, float]]):
+        self.gauges[name] = fn
+
+    def percentiles(self, stage: str, points: Tuple[float, ...] = (0.5, 0.99)) -> List[float]:
+        ordered = sorted(self.samples.get(stage, ()))
+        if not ordered:
+            return [0.0 for _ in points]
+        return [ordered[min(len(ordered) - 1, int(point * len(ordered)))] for point in points]
+
+    def stage_summary(self) -> Dict[str, Tuple[float, float, int]]:
+        summary = {}
+        for stage in sorted(self.samples):
+            p50, p99 = self.percentiles(stage)
+            summary[stage] = (p50, p99, self.totals[stage][0])
+        return summary
+
+    def render_prometheus(self) -> str:
+        lines = []
+
+        by_name = defaultdict(list)
+        for (name, labels), value in self.counters.items():
+            by_name[name].append((labels, value))
+        for name in sorted(by_name):
+            metric = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{metric}{_format_labels(labels)} {value}")
+
+        if self.samples:
+            metric = f"{self.prefix}_stage_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for stage in sorted(self.samples):
+                for point, value in zip((0.5, 0.95, 0.99), self.percentiles(stage, (0.5, 0.95, 0.99))):
+                    lines.append(f"{metric}{_format_labels((('stage', stage), ('quantile', str(point))))} {value:.6f}")
+                count, total = self.totals[stage]
+                lines.append(f"{metric}_count{_format_labels((('stage', stage),))} {count}")
+                lines.append(f"{metric}_sum{_format_labels((('stage', stage),))} {total:.6f}")
+
+        for name in sorted(self.gauges):
+            try:
+                values = self.gauges[name]()
+            except Exception:
+                continue
+            for field, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    metric = f"{self.prefix}_{name}_{field}"
+                    lines.append(f"# TYPE {metric} gauge")
+                    lines.append(f"{metric} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+    async def start_server(self, host: str = '127.0.0.1', port: int = 9108) -> web.AppRunner:
+        #loopback only unless a host is given, the metrics aren't meant for the outside world
+        async def handle(_request: web.Request) -> web.Response:
+            return web.Response(text=self.render_prometheus(), content_type='text/plain', charset='utf-8')
+
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+#process-wide registry shared by the scraper, database and commands
+metrics = Metrics()
@@ -0,0 +1,82 @@
+import sys
+from typing import Dict, Optional
+
+#embeds never show more than this much of a description
+MAX_DESCRIPTION_LENGTH = 4000
+
+
+class Job:
+    #only the fields the bot reads, raw JSearch payloads are dropped at the scraper boundary
+    FIELDS = (
+        'job_id',
+        'job_title',
+        'employer_name',
+        'job_description',
+        'job_city',
+        'job_employment_type',
+        'job_min_salary',
+        'job_max_salary',
+        'job_salary_period',
+        'job_is_remote',
+        'job_posted_at_datetime_utc',
+        'job_apply_link'
+    )
+    #fingerprint is a memoized near-duplicate hash, never serialized
+    __slots__ = FIELDS + ('fingerprint',)
+
+    def __init__(self, job_id: str = '', job_title: str = '', employer_name: str = '',
+                 job_description: str = '', job_city: Optional[str] = None,
+                 job_employment_type: Optional[str] = None, job_min_salary: Optional[float] = None,
+                 job_max_salary: Optional[float] = None, job_salary_period: Optional[str] = None,
+                 job_is_remote: Optional[bool] = None, job_posted_at_datetime_utc: Optional[str] = None,
+                 job_apply_link: Optional[str] = None):
+        self.job_id = job_id
+        self.job_title = job_title
+        self.employer_name = employer_name
+        self.job_description = job_description
+        self.job_city = job_city
+        self.job_employment_type = job_employment_type
+        self.job_min_salary = job_min_salary
+        self.job_max_salary = job_max_salary
+        self.job_salary_period = job_salary_period
+        self.job_is_remote = job_is_remote
+        self.job_posted_at_datetime_utc = job_posted_at_datetime_utc
+        self.job_apply_link = job_apply_link
+        self.fingerprint = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Job':
+        #works for raw API payloads and for records saved with to_dict
+        return cls(
+            job_id=data.get('job_id') or '',
+            job_title=(data.get('job_title') or '').strip(),
+            employer_name=_intern((data.get('employer_name') or '').strip()),
+            job_description=(data.get('job_description') or 'No description')[:MAX_DESCRIPTION_LENGTH],
+            job_city=_intern(data.get('job_city')),
+            job_employment_type=_intern(data.get('job_employment_type')),
+            job_min_salary=data.get('job_min_salary'),
+            job_max_salary=data.get('job_max_salary'),
+            job_salary_period=_intern(data.get('job_salary_period')),
+            job_is_remote=data.get('job_is_remote'),
+            job_posted_at_datetime_utc=data.get('job_posted_at_datetime_utc'),
+            job_apply_link=data.get('job_apply_link')
+        )
+
+    def to_dict(self) -> Dict:
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    def approx_size(self) -> int:
+        size = sys.getsizeof(self)
+        for field in self.__slots__:
+            value = getattr(self, field)
+            if value is not None:
+                size += sys.getsizeof(value)
+        return size
+
+    def __repr__(self) -> str:
+        return f"Job({self.job_title!r} at {self.employer_name!r})"
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    #employers, cities and types repeat across thousands of records
+    return sys.intern(value) if isinstance(value, str) else value
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from breaker import CLOSED
+from commands import JobQuery, parse_job_command
+from metrics import metrics
+from ratelimit import PRIORITY_PREFETCH
+
+
+def canonical_key(job_query: JobQuery) -> Tuple:
+    #searches that differ only in case, word order or location spelling count as one;
+    #parse_job_command has already mapped location aliases
+    query = ' '.join(sorted(job_query.query.lower().split()))
+    location = '' if job_query.remote_only else job_query.location
+    return query, location, job_query.remote_only, job_query.date_posted
+
+
+class QueryProfile:
+    #how often each canonical search ran in each hour of the day, from search history
+    def __init__(self, rows: List[Tuple[str, int, int]]):
+        self.by_hour = defaultdict(Counter)
+        self.forms = defaultdict(Counter)
+        self.hour_totals = Counter()
+
+        for raw_query, hour, uses in rows:
+            job_query = parse_job_command(raw_query)
+            if not job_query.query.strip() or job_query.local_only:
+                continue
+            key = canonical_key(job_query)
+            self.by_hour[hour][key] += uses
+            self.hour_totals[hour] += uses
+            #the spelling users type most is the one prefetched, so its cache key is the one warmed
+            self.forms[key][raw_query] += uses
+
+    def is_peak(self, hour: int) -> bool:
+        if not self.hour_totals:
+            return False
+        return self.hour_totals[hour] >= sum(self.hour_totals.values()) / 24
+
+    def top(self, hour: int, limit: int) -> List[Tuple[JobQuery, int]]:
+        top = []
+        for key, uses in self.by_hour[hour].most_common(limit):
+            raw_query = self.forms[key].most_common(1)[0][0]
+            top.append((parse_job_command(raw_query), uses))
+        return top
+
+
+class PrefetchScheduler:
+    def __init__(self, bot, db, job_scraper, top_n: int = 10, interval: float = 300, lead: float = 600,
+                 history_days: int = 14, budget_per_hour: int = 60, profile_ttl: float = 3600):
+        self.bot = bot
+        self.db = db
+        self.job_scraper = job_scraper
+        self.top_n = top_n
+        self.interval = interval
+        #how far ahead of an hour its popular searches are fetched, well inside the cache TTL
+        self.lead = lead
+        self.history_days = history_days
+        self.budget_per_hour = budget_per_hour
+        self.profile_ttl = profile_ttl
+        self._task = None
+
+        self._profile = None
+        self._profile_loaded_at = 0.0
+        self._budget_hour = None
+        self._budget_spent = 0
+
+        self.runs = 0
+        self.prefetches = 0
+        self.skipped_busy = 0
+
+        metrics.register_gauges('prefetch', self.stats)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            started = time.monotonic()
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"Prefetch failed: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    async def _load_profile(self) -> QueryProfile:
+        #history changes slowly, the aggregate is rebuilt once per profile_ttl
+        if self._profile is None or time.monotonic() - self._profile_loaded_at > self.profile_ttl:
+            self._profile = QueryProfile(await self.db.get_query_hours(self.history_days))
+            self._profile_loaded_at = time.monotonic()
+        return self._profile
+
+    async def run_once(self, now: Optional[datetime] = None) -> int:
+        self.runs += 1
+        now = now or datetime.utcnow()
+        hour = (now + timedelta(seconds=self.lead)).hour
+
+        #prefetching never probes an API the breaker considers unhealthy
+        if self.job_scraper.breaker.state != CLOSED:
+            return 0
+
+        profile = await self._load_profile()
+        if not profile.is_peak(hour):
+            return 0
+
+        #quota is budgeted per wall-clock hour
+        if self._budget_hour != now.hour:
+            self._budget_hour = now.hour
+            self._budget_spent = 0
+
+        prefetched = 0
+        with metrics.span('prefetch'):
+            for job_query, _uses in profile.top(hour, self.top_n):
+                if self._budget_spent >= self.budget_per_hour:
+                    break
+                #only quota interactive searches aren't using, the rest waits for the next run
+                if not self.job_scraper.scheduler.idle():
+                    self.skipped_busy += 1
+                    break
+                spent_before = self.quota_spent()
+                try:
+                    fetched = await self.job_scraper.prefetch(job_query)
+                except Exception as e:
+                    print(f"Prefetch failed for '{job_query.query}': {e}")
+                    continue
+                self._budget_spent += self.quota_spent() - spent_before
+                if fetched:
+                    prefetched += 1
+                    self.prefetches += 1
+                    metrics.inc('prefetches')
+        return prefetched
+
+    def quota_spent(self) -> int:
+        return self.job_scraper.requests_by_priority[PRIORITY_PREFETCH]
+
+    def stats(self) -> Dict[str, float]:
+        hits = self.job_scraper.prefetch_hits
+        return {
+            'runs': self.runs,
+            'prefetches': self.prefetches,
+            'hits': hits,
+            'hit_rate': round(hits / self.prefetches, 3) if self.prefetches else 0.0,
+            'quota_spent': self.quota_spent(),
+            'skipped_busy': self.skipped_busy
+        }
@@ -0,0 +1,174 @@
+import asyncio
+import heapq
+import itertools
+import math
+import random
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+#lower value is admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_PREFETCH = 2
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class RequestScheduler:
+    def __init__(self, rate: float = 5.0, burst: int = 5, shared=None, bucket: str = 'rapidapi',
+                 max_wait: float = 60.0):
+        self.rate = rate
+        self.burst = burst
+        #longest a request waits out an upstream rate-limit window, past it requests fail at once
+        #so callers can fall back to stale results, e.g. when the plan quota is used up
+        self.max_wait = max_wait
+
+        #optional SharedStore, when several shard processes run the rate is a budget for all of them
+        self.shared = shared
+        self.bucket = bucket
+        self._shared_blocks = set()
+
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+
+        #heap of (priority, seq, enqueued_at, future)
+        self._queue = []
+        self._seq = itertools.count()
+        self._wakeup = None
+
+        self.admitted = 0
+        self.throttled = 0
+        self._waits = deque(maxlen=500)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        if self.blocked_for() > self.max_wait:
+            raise RateLimitExceeded("Rate limit exceeded. Please try again later.")
+        self._refill()
+        if self._queue or not self._can_admit():
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            heapq.heappush(self._queue, (priority, next(self._seq), time.monotonic(), future))
+            self._schedule(0)
+            #a cancelled waiter is skipped lazily when it reaches the front of the queue
+            await future
+        else:
+            self._admit(0.0)
+
+        #priority is settled locally, the shared bucket only caps the total across processes
+        if self.shared is not None:
+            if not await self.shared.acquire_token(self.bucket, self.rate, self.burst, self.max_wait):
+                raise RateLimitExceeded("Rate limit exceeded. Please try again later.")
+
+    def backoff(self, delay: float):
+        #called on 429, nothing is admitted until the upstream window reopens
+        self.throttled += 1
+        self._tokens = 0.0
+        self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        if delay > self.max_wait:
+            #nobody already queued would be let through in time either
+            for _priority, _seq, _enqueued_at, future in self._queue:
+                if not future.done():
+                    future.set_exception(RateLimitExceeded("Rate limit exceeded. Please try again later."))
+            self._queue.clear()
+        if self._queue:
+            self._schedule(delay)
+
+        if self.shared is not None:
+            task = asyncio.ensure_future(self.shared.block(self.bucket, delay))
+            self._shared_blocks.add(task)
+            task.add_done_callback(self._shared_block_done)
+
+    def _shared_block_done(self, task: asyncio.Task):
+        self._shared_blocks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Shared rate limit update failed: {task.exception()}")
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _can_admit(self) -> bool:
+        return self._tokens >= 1 and time.monotonic() >= self._blocked_until
+
+    def _admit(self, waited: float):
+        self._tokens -= 1
+        self.admitted += 1
+        self._waits.append(waited)
+
+    def _schedule(self, delay: float):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        loop = asyncio.get_running_loop()
+        self._wakeup = loop.call_later(max(delay, 0), self._dispatch)
+
+    def _dispatch(self):
+        self._wakeup = None
+        self._refill()
+
+        while self._queue:
+            _priority, _seq, enqueued_at, future = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            if not self._can_admit():
+                break
+            heapq.heappop(self._queue)
+            self._admit(time.monotonic() - enqueued_at)
+            future.set_result(None)
+
+        if any(not entry[3].done() for entry in self._queue):
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, (1 - self._tokens) / self.rate)
+            self._schedule(delay)
+        else:
+            self._queue.clear()
+
+    def blocked_for(self) -> float:
+        return max(0.0, self._blocked_until - time.monotonic())
+
+    def idle(self) -> bool:
+        #nothing waiting and the bucket full, so a request now takes quota nobody else wants
+        self._refill()
+        return (not self.queue_depth() and self._tokens >= self.burst - 1
+                and time.monotonic() >= self._blocked_until)
+
+    def queue_depth(self) -> int:
+        return sum(1 for entry in self._queue if not entry[3].done())
+
+    def stats(self) -> Dict[str, float]:
+        waits = sorted(self._waits)
+        return {
+            'queue_depth': self.queue_depth(),
+            'admitted': self.admitted,
+            'throttled': self.throttled,
+            'avg_wait_ms': round(sum(waits) / len(waits) * 1000, 1) if waits else 0.0,
+            'max_wait_ms': round(waits[-1] * 1000, 1) if waits else 0.0,
+            'blocked_for_s': round(self.blocked_for(), 1)
+        }
+
+
+def retry_delay(retry_after: Optional[str], attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    delay = None
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+
+    #a window the server asked for is kept as is, callers decide whether it is worth waiting out
+    if delay is None or not math.isfinite(delay) or delay < 0:
+        delay = min(cap, base * 2 ** attempt)
+    else:
+        cap = max(cap, delay)
+
+    #jitter keeps queued requests from all retrying on the same tick
+    return min(cap, delay + random.uniform(0, base * 2 ** attempt))
@@ -0,0 +1,76 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from dedupe import DEFAULT_THRESHOLD, NearDuplicateDetector
+from metrics import metrics
+from models import Job
+
+
+def recent_scope(guild_id: Optional[int], channel_id: int) -> str:
+    #direct messages have no guild
+    return f"{guild_id or 0}:{channel_id}"
+
+
+class RecentJobsStore:
+    def __init__(self, db, capacity: int = 20, max_channels: int = 1000,
+                 near_duplicate_threshold: int = DEFAULT_THRESHOLD):
+        self.db = db
+        self.capacity = capacity
+        self.max_channels = max_channels
+        self.near_duplicate_threshold = near_duplicate_threshold
+
+        #scope -> ring buffer of the newest jobs, least recently used channel first;
+        #memory is capped at max_channels * capacity jobs however many guilds the bot is in
+        self._buffers = OrderedDict()
+
+        self.loads = 0
+        self.evictions = 0
+
+        metrics.register_gauges('recent_jobs', self.stats)
+
+    async def _buffer(self, scope: str) -> deque:
+        buffer = self._buffers.get(scope)
+        if buffer is None:
+            #channels evicted or not seen since the last restart are read back on first use
+            jobs = await self.db.get_recent_jobs(scope, self.capacity)
+            self.loads += 1
+            #another command may have loaded the same channel while this one waited
+            buffer = self._buffers.get(scope)
+            if buffer is None:
+                buffer = self._buffers[scope] = deque(jobs, maxlen=self.capacity)
+                while len(self._buffers) > self.max_channels:
+                    self._buffers.popitem(last=False)
+                    self.evictions += 1
+        self._buffers.move_to_end(scope)
+        return buffer
+
+    async def warm(self, limit: int = 100) -> int:
+        #load the most recently active channels before the bot starts taking commands
+        scopes = (await self.db.get_recent_scopes(min(limit, self.max_channels)))[::-1]
+        for scope in scopes:
+            await self._buffer(scope)
+        return len(scopes)
+
+    async def get(self, scope: str, limit: int = None) -> List[Job]:
+        jobs = list(await self._buffer(scope))
+        return jobs[-limit:] if limit else jobs
+
+    async def add(self, scope: str, jobs: List[Job]):
+        buffer = await self._buffer(scope)
+
+        #the same posting found by different searches is only listed once
+        near_duplicates = NearDuplicateDetector(self.near_duplicate_threshold)
+        for job in buffer:
+            near_duplicates.add_job(job)
+        new_jobs = near_duplicates.filter(jobs)
+        if not new_jobs:
+            return
+
+        buffer.extend(new_jobs)
+        await self.db.add_recent_jobs(scope, new_jobs, self.capacity)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'channels': len(self._buffers),
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
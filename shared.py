@@ -0,0 +1,235 @@
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from metrics import metrics
+from models import Job
+
+
+def encode_jobs(jobs: List[Job]) -> bytes:
+    return zlib.compress(json.dumps([job.to_dict() for job in jobs], separators=(',', ':')).encode('utf-8'))
+
+
+def decode_jobs(data: bytes) -> Optional[List[Job]]:
+    try:
+        return [Job.from_dict(job) for job in json.loads(zlib.decompress(data))]
+    except (zlib.error, ValueError, TypeError):
+        return None
+
+
+class SharedStore:
+    #state every shard process on the host agrees on: cached API pages, fetch leases and the
+    #RapidAPI token bucket; a small SQLite file so no extra service has to run next to the bot
+    def __init__(self, path: str = "job_bot_shared.db"):
+        self.path = path
+        self.owner = f"{os.getpid()}"
+
+        #one thread and one connection per process, every write is a short IMMEDIATE transaction
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shared-store')
+        self._conn = None
+        self._cache_purged_at = 0.0
+
+        self.token_waits = 0
+        self.lease_waits = 0
+
+        self._run(self._init)
+        metrics.register_gauges('shared_store', lambda: {
+            'token_waits': self.token_waits,
+            'lease_waits': self.lease_waits
+        })
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            #autocommit mode, transactions are opened explicitly with BEGIN IMMEDIATE
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('PRAGMA busy_timeout=5000')
+        return self._conn
+
+    def _run(self, fn, *args):
+        conn = self._connection()
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            result = fn(cursor, *args)
+            cursor.execute('COMMIT')
+            return result
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+
+    def _run_read(self, fn, *args):
+        #single SELECTs run in autocommit, so lookups never queue on the cross-process write lock
+        return fn(self._connection().cursor(), *args)
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        with metrics.span('shared_store'):
+            return await loop.run_in_executor(self._executor, self._run, fn, *args)
+
+    async def _read(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        with metrics.span('shared_store'):
+            return await loop.run_in_executor(self._executor, self._run_read, fn, *args)
+
+    @staticmethod
+    def _init(cursor: sqlite3.Cursor):
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS api_cache (
+                cache_key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                job_data BLOB NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS fetch_leases (
+                cache_key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS token_buckets (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            ) WITHOUT ROWID
+        ''')
+
+    async def close(self):
+        def shutdown():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, shutdown)
+        self._executor.shutdown(wait=True)
+
+    #cached API pages
+
+    async def get_page(self, key: Tuple) -> Optional[Tuple[List[Job], float]]:
+        #returns the jobs with their wall clock expiry, so local copies don't outlive the shared one
+        row = await self._read(self._get_page, json.dumps(key), time.time())
+        metrics.inc('shared_cache_lookups', result='miss' if row is None else 'hit')
+        if row is None:
+            return None
+        return decode_jobs(row[0]), row[1]
+
+    @staticmethod
+    def _get_page(cursor: sqlite3.Cursor, cache_key: str, now: float) -> Optional[Tuple[bytes, float]]:
+        return cursor.execute('SELECT job_data, expires_at FROM api_cache WHERE cache_key = ? AND expires_at > ?',
+                              (cache_key, now)).fetchone()
+
+    async def set_page(self, key: Tuple, jobs: List[Job], ttl: float):
+        now = time.time()
+        #expired pages are purged at most once a minute by whichever process writes next
+        purge = now - self._cache_purged_at > 60
+        if purge:
+            self._cache_purged_at = now
+        await self._call(self._set_page, json.dumps(key), encode_jobs(jobs), now, now + ttl, purge)
+
+    @staticmethod
+    def _set_page(cursor: sqlite3.Cursor, cache_key: str, job_data: bytes, now: float, expires_at: float,
+                  purge: bool):
+        cursor.execute('INSERT OR REPLACE INTO api_cache (cache_key, expires_at, job_data) VALUES (?, ?, ?)',
+                       (cache_key, expires_at, job_data))
+        cursor.execute('DELETE FROM fetch_leases WHERE cache_key = ?', (cache_key,))
+        if purge:
+            cursor.execute('DELETE FROM api_cache WHERE expires_at <= ?', (now,))
+            cursor.execute('DELETE FROM fetch_leases WHERE expires_at <= ?', (now,))
+
+    #fetch leases, so only one process calls the API for a page the others are also missing
+
+    async def claim(self, key: Tuple, lease: float) -> bool:
+        return await self._call(self._claim, json.dumps(key), self.owner, time.time(), lease)
+
+    @staticmethod
+    def _claim(cursor: sqlite3.Cursor, cache_key: str, owner: str, now: float, lease: float) -> bool:
+        row = cursor.execute('SELECT owner, expires_at FROM fetch_leases WHERE cache_key = ?',
+                             (cache_key,)).fetchone()
+        if row is not None and row[1] > now and row[0] != owner:
+            return False
+        cursor.execute('INSERT OR REPLACE INTO fetch_leases (cache_key, owner, expires_at) VALUES (?, ?, ?)',
+                       (cache_key, owner, now + lease))
+        return True
+
+    async def release(self, key: Tuple):
+        await self._call(self._release, json.dumps(key), self.owner)
+
+    @staticmethod
+    def _release(cursor: sqlite3.Cursor, cache_key: str, owner: str):
+        cursor.execute('DELETE FROM fetch_leases WHERE cache_key = ? AND owner = ?', (cache_key, owner))
+
+    async def wait_for_page(self, key: Tuple, timeout: float,
+                            poll_interval: float = 0.2) -> Optional[Tuple[List[Job], float]]:
+        #another process holds the lease, its result lands in api_cache when the fetch finishes
+        self.lease_waits += 1
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(poll_interval)
+            row = await self._read(self._get_page, json.dumps(key), time.time())
+            if row is not None:
+                return decode_jobs(row[0]), row[1]
+            if await self._read(self._lease_released, json.dumps(key), time.time()):
+                return None
+        return None
+
+    @staticmethod
+    def _lease_released(cursor: sqlite3.Cursor, cache_key: str, now: float) -> bool:
+        row = cursor.execute('SELECT 1 FROM fetch_leases WHERE cache_key = ? AND expires_at > ?',
+                             (cache_key, now)).fetchone()
+        return row is None
+
+    #shared token bucket, wall clock so every process measures refills the same way
+
+    async def acquire_token(self, name: str, rate: float, burst: int, max_wait: float = None) -> bool:
+        #False when the bucket is blocked for longer than max_wait, e.g. by another process's 429
+        while True:
+            wait = await self._call(self._take_token, name, rate, burst, time.time())
+            if wait <= 0:
+                return True
+            if max_wait is not None and wait > max_wait:
+                return False
+            self.token_waits += 1
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def _take_token(cursor: sqlite3.Cursor, name: str, rate: float, burst: int, now: float) -> float:
+        row = cursor.execute('SELECT tokens, updated_at, blocked_until FROM token_buckets WHERE name = ?',
+                             (name,)).fetchone()
+        tokens, updated_at, blocked_until = row if row else (float(burst), now, 0.0)
+        tokens = min(float(burst), tokens + max(0.0, now - updated_at) * rate)
+
+        if now < blocked_until:
+            wait = blocked_until - now
+        elif tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+
+        cursor.execute('''
+            INSERT OR REPLACE INTO token_buckets (name, tokens, updated_at, blocked_until)
+            VALUES (?, ?, ?, ?)
+        ''', (name, tokens, now, blocked_until))
+        return wait
+
+    async def block(self, name: str, delay: float):
+        now = time.time()
+        await self._call(self._block, name, now, now + delay)
+
+    @staticmethod
+    def _block(cursor: sqlite3.Cursor, name: str, now: float, blocked_until: float):
+        cursor.execute('''
+            INSERT INTO token_buckets (name, tokens, updated_at, blocked_until) VALUES (?, 0, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                tokens = 0,
+                updated_at = excluded.updated_at,
+                blocked_until = MAX(blocked_until, excluded.blocked_until)
+        ''', (name, now, blocked_until))
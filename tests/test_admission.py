@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+from admission import AdmissionController, AdmissionRejected
+
+
+async def admitted_order(admission: AdmissionController, requests, order: list):
+    #queues every (user, guild) request and records users as they are let in
+    async def request(user_id: int, guild_id: int):
+        ticket = await admission.acquire(user_id, guild_id)
+        order.append(user_id)
+        return ticket
+
+    tasks = [asyncio.ensure_future(request(user_id, guild_id)) for user_id, guild_id in requests]
+    await asyncio.sleep(0)
+    return tasks
+
+
+def test_busy_guild_does_not_starve_another():
+    async def run():
+        admission = AdmissionController(max_active=1, per_guild=5, max_queued=50)
+        ticket = await admission.acquire(1, 100)
+
+        #guild 100 queues five searches before guild 200 asks for one
+        requests = [(user_id, 100) for user_id in range(2, 7)] + [(9, 200)]
+        guilds = dict(requests)
+        order = []
+        await admitted_order(admission, requests, order)
+        while len(order) < len(requests):
+            admission.release(ticket)
+            await asyncio.sleep(0)
+            ticket = guilds[order[-1]], order[-1]
+
+        #one search of guild 100 was tagged before it, the other four come after
+        assert order.index(9) == 1
+        admission.release(ticket)
+        assert admission.stats()['active'] == 0
+
+    asyncio.run(run())
+
+
+def test_per_guild_cap_leaves_slots_for_other_guilds():
+    async def run():
+        admission = AdmissionController(max_active=4, per_guild=1)
+        await admission.acquire(1, 100)
+
+        order = []
+        tasks = await admitted_order(admission, [(2, 100), (3, 200)], order)
+        assert order == [3]
+        assert admission.queued() == 1
+        tasks[0].cancel()
+
+    asyncio.run(run())
+
+
+def test_release_dispatches_the_next_waiter():
+    async def run():
+        admission = AdmissionController(max_active=1)
+        ticket = await admission.acquire(1, 100)
+
+        order = []
+        tasks = await admitted_order(admission, [(2, 100)], order)
+        assert order == []
+        admission.release(ticket)
+        await asyncio.sleep(0)
+        assert order == [2]
+        admission.release(tasks[0].result())
+        assert admission.stats()['active'] == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def run():
+        admission = AdmissionController(max_active=1)
+        ticket = await admission.acquire(1, 100)
+
+        order = []
+        tasks = await admitted_order(admission, [(2, 100), (3, 200)], order)
+        assert admission.queued() == 2
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        assert admission.queued() == 1
+
+        #the slot goes to the remaining waiter, and the cancelled user may queue again
+        admission.release(ticket)
+        await asyncio.sleep(0)
+        assert order == [3]
+        assert admission.stats()['active'] == 1
+        again = await admitted_order(admission, [(2, 100)], order)
+        assert admission.queued() == 1
+        again[0].cancel()
+
+    asyncio.run(run())
+
+
+def test_overload_is_rejected():
+    async def run():
+        admission = AdmissionController(max_active=1, max_queued=1, per_user_queued=1)
+        await admission.acquire(1, 100)
+
+        #one running and one queued search per user at most
+        tasks = await admitted_order(admission, [(1, 100)], [])
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(1, 100)
+
+        #the queue is full for everyone else too
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(2, 200)
+        assert admission.stats()['rejected'] == 2
+        tasks[0].cancel()
+
+    asyncio.run(run())
@@ -0,0 +1,58 @@
+import asyncio
+import sqlite3
+import time
+from alerts import AlertScheduler, alert_key
+from commands import parse_job_command
+from database import DatabaseManager
+from models import Job
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, embed=None):
+        self.sent.append(embed)
+
+
+class FakeBot:
+    def __init__(self, channel):
+        self.channel = channel
+
+    def get_channel(self, _channel_id):
+        return self.channel
+
+
+class FakeScraper:
+    def __init__(self, jobs):
+        self.jobs = jobs
+
+    async def search_jobs(self, *_args, **_kwargs):
+        return self.jobs
+
+
+def test_postings_still_in_results_are_not_announced_again(tmp_path):
+    async def run():
+        db = DatabaseManager(str(tmp_path / 'bot.db'))
+        raw_query = 'python developer'
+        await db.add_alert(1, None, 10, raw_query, alert_key(parse_job_command(raw_query)))
+
+        channel = FakeChannel()
+        jobs = [Job(job_id='a', job_title='Python developer', employer_name='Acme')]
+        scheduler = AlertScheduler(FakeBot(channel), db, FakeScraper(jobs))
+
+        #the first poll only records a baseline
+        await scheduler.run_once()
+
+        #the posting has been in every result for a month
+        conn = sqlite3.connect(db.db_path)
+        conn.execute('UPDATE alert_seen SET seen_at = ?', (time.time() - 31 * 24 * 3600,))
+        conn.commit()
+        conn.close()
+
+        await scheduler.run_once()
+        await scheduler.run_once()
+        assert channel.sent == []
+        await db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,89 @@
+import asyncio
+import sqlite3
+import pytest
+from breaker import CircuitBreaker, CircuitOpenError, HALF_OPEN, OPEN
+from components import RapidAPIJobScraper
+from ratelimit import RequestScheduler
+
+
+class FailingScheduler(RequestScheduler):
+    #acquire fails the way the shared token bucket can under lock contention
+    def __init__(self, error: BaseException):
+        super().__init__()
+        self.error = error
+        self.calls = 0
+
+    async def acquire(self, _priority: int = 0):
+        self.calls += 1
+        raise self.error
+
+
+class BlockingScheduler(RequestScheduler):
+    async def acquire(self, _priority: int = 0):
+        await asyncio.Event().wait()
+
+
+def half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(min_calls=1, open_seconds=0)
+    breaker.record(False, 0.1, "API Error: 500")
+    assert breaker.state == OPEN
+    return breaker
+
+
+def make_scraper(breaker: CircuitBreaker, scheduler) -> RapidAPIJobScraper:
+    return RapidAPIJobScraper('key', breaker=breaker, scheduler=scheduler, max_retries=0)
+
+
+def test_probe_released_when_acquire_raises():
+    async def run():
+        breaker = half_open_breaker()
+        scheduler = FailingScheduler(sqlite3.OperationalError('database is locked'))
+        scraper = make_scraper(breaker, scheduler)
+        key = ('python', '', False, 'all', 1)
+
+        with pytest.raises(sqlite3.OperationalError):
+            await scraper._fetch_page(key, 0)
+        assert breaker.state == HALF_OPEN
+        assert breaker._probes == 0
+
+        #the next request gets the probe slot instead of failing fast
+        with pytest.raises(sqlite3.OperationalError):
+            await scraper._fetch_page(key, 0)
+        assert scheduler.calls == 2
+        await scraper.close()
+
+    asyncio.run(run())
+
+
+def test_probe_released_when_waiter_cancelled():
+    async def run():
+        breaker = half_open_breaker()
+        scraper = make_scraper(breaker, BlockingScheduler())
+        key = ('python', '', False, 'all', 1)
+
+        task = asyncio.ensure_future(scraper._fetch_page(key, 0))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert breaker.state == HALF_OPEN
+        assert breaker._probes == 0
+        breaker.check()
+        await scraper.close()
+
+    asyncio.run(run())
+
+
+def test_open_breaker_fails_fast():
+    async def run():
+        breaker = CircuitBreaker(min_calls=1, open_seconds=60)
+        breaker.record(False, 0.1, "API Error: 500")
+        scheduler = FailingScheduler(AssertionError('scheduler should not be reached'))
+        scraper = make_scraper(breaker, scheduler)
+
+        with pytest.raises(CircuitOpenError):
+            await scraper._fetch_page(('python', '', False, 'all', 1), 0)
+        assert scheduler.calls == 0
+        await scraper.close()
+
+    asyncio.run(run())
@@ -0,0 +1,224 @@
+import asyncio
+import gc
+from types import SimpleNamespace
+import aiohttp
+import pytest
+from cache import SingleFlight, TTLCache
+from components import RapidAPIJobScraper
+from models import Job
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr('cache.time', SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_entries_expire_after_their_ttl(clock):
+    cache = TTLCache()
+    cache.set('a', 1, 10, 60)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is None
+    assert cache.expirations == 1
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entry_is_evicted_by_count(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set('a', 1, 10, 60)
+    cache.set('b', 2, 10, 60)
+    cache.get('a')
+    cache.set('c', 3, 10, 60)
+    assert cache.peek('b') is None
+    assert cache.peek('a') == 1 and cache.peek('c') == 3
+    assert cache.evictions == 1
+
+
+def test_entries_are_evicted_by_bytes(clock):
+    cache = TTLCache(max_bytes=100)
+    cache.set('a', 1, 60, 60)
+    cache.set('b', 2, 60, 60)
+    assert cache.peek('a') is None
+    assert cache.stats()['bytes'] == 60
+
+    #a value bigger than the whole budget is not cached and evicts nothing
+    cache.set('c', 3, 200, 60)
+    assert cache.peek('c') is None
+    assert cache.peek('b') == 2
+
+
+def test_expired_entries_are_kept_for_the_stale_window(clock):
+    cache = TTLCache(stale_ttl=30)
+    cache.set('a', 1, 10, 60)
+    clock.now += 61
+    assert cache.get('a') is None
+    assert cache.peek('a') is None
+    assert cache.get_stale('a') == 1
+    assert cache.stale_hits == 1
+
+    clock.now += 30
+    assert cache.get_stale('a') is None
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_concurrent_callers_share_one_call():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flight.do('page', load) for _ in range(5)))
+        assert results == [1] * 5
+        assert calls == 1
+        assert flight.shared == 4
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_error_reaches_every_caller_and_is_not_cached():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def load():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise aiohttp.ClientError('upstream failed')
+
+        results = await asyncio.gather(*(flight.do('page', load) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, aiohttp.ClientError) for result in results)
+        assert calls == 1
+
+        #the next caller tries again instead of getting the old error
+        with pytest.raises(aiohttp.ClientError):
+            await flight.do('page', load)
+        assert calls == 2
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiter_leaves_the_call_running_for_the_others():
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def load():
+            await release.wait()
+            return 'page'
+
+        first = asyncio.ensure_future(flight.do('page', load))
+        second = asyncio.ensure_future(flight.do('page', load))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == 'page'
+        assert first.cancelled()
+
+    asyncio.run(run())
+
+
+def test_call_is_cancelled_once_every_waiter_is_gone():
+    async def run():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def load():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.ensure_future(flight.do('page', load)) for _ in range(2)]
+        await started.wait()
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_caller_after_last_waiter_cancels_starts_a_fresh_request():
+    async def run():
+        flight = SingleFlight()
+        calls = 0
+
+        async def slow_load():
+            nonlocal calls
+            calls += 1
+            try:
+                await asyncio.sleep(10)
+            finally:
+                #cleanup that keeps the cancelled task alive for a moment, like a shielded lease release
+                await asyncio.shield(asyncio.sleep(0.01))
+
+        async def quick_load():
+            nonlocal calls
+            calls += 1
+            return 'fresh'
+
+        first = asyncio.ensure_future(flight.do('page', slow_load))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+
+        #the cancelled task is still winding down, the next caller must not join it
+        assert await flight.do('page', quick_load) == 'fresh'
+        assert calls == 2
+        assert first.cancelled()
+        assert len(flight) == 0
+
+    asyncio.run(run())
+
+
+def test_failed_pages_past_the_break_are_retrieved():
+    async def run():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda _loop, context: errors.append(context))
+        scraper = RapidAPIJobScraper('key')
+
+        async def get_page(_key, page, _priority):
+            if page == 1:
+                return [Job(job_id=str(i), job_title=f"Job {i}", employer_name=f"Acme {i}") for i in range(10)]
+            if page == 2:
+                raise aiohttp.ClientError("page 2 failed")
+            #the later pages are still loading when the search gives up and fail as they unwind
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                raise aiohttp.ClientError(f"page {page} failed")
+
+        scraper._get_page = get_page
+        jobs = await scraper.search_jobs('python', limit=20)
+        assert len(jobs) == 10
+
+        await asyncio.sleep(0.01)
+        gc.collect()
+        assert errors == []
+        await scraper.close()
+
+    asyncio.run(run())
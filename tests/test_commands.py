@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from discord.ext import commands
+from admission import AdmissionController
+from commands import MAX_AGE_DAYS, parse_job_command, setup_commands
+from components import RapidAPIJobScraper
+from database import DatabaseManager
+from filters import compile_filter
+from recent import RecentJobsStore
+
+
+def test_unreadable_amounts_are_ignored():
+    for amount in ('inf', '-inf', 'nan', '1e999', '1e300', '-5'):
+        job_query = parse_job_command(f"python --salary {amount} --max-salary {amount}")
+        assert job_query.min_salary is None
+        assert job_query.filters.max_salary is None
+    assert parse_job_command('python --salary 70k').min_salary == 70000
+
+
+def test_max_age_is_clamped():
+    job_query = parse_job_command('python --max-age 1000000')
+    assert job_query.filters.max_age_days == MAX_AGE_DAYS
+    compile_filter(job_query.filters)
+
+
+class FakeMessage:
+    def __init__(self, embed=None):
+        self.id = id(self)
+        self.embed = embed
+
+    async def edit(self, embed=None, view=None, **_kwargs):
+        self.embed = embed
+
+
+class FakeContext:
+    def __init__(self, user_id: int):
+        self.author = SimpleNamespace(id=user_id)
+        self.guild = SimpleNamespace(id=1)
+        self.channel = SimpleNamespace(id=2)
+        self.message = None
+        self.sent = []
+
+    async def send(self, content=None, embed=None, **_kwargs):
+        message = FakeMessage(embed)
+        self.sent.append(message)
+        return message
+
+
+def test_rejected_searches_are_not_recorded(tmp_path):
+    async def run():
+        db = DatabaseManager(str(tmp_path / 'bot.db'))
+        bot = commands.Bot(command_prefix='.', intents=discord.Intents.default(), help_command=None)
+        admission = AdmissionController(max_active=0, max_queued=0)
+        setup_commands(bot, db, RapidAPIJobScraper('key'), RecentJobsStore(db), (0xff0000, 0xffffff, 0x00ff00),
+                       admission)
+
+        ctx = FakeContext(1)
+        await bot.get_command('jobs').callback(ctx, search_query='python --local')
+        assert ctx.sent[-1].embed.title == "Too Busy"
+        await db.flush_search_history()
+        assert await db.get_search_history(1) == []
+
+        admission.max_active = 1
+        admission.max_queued = 1
+        await bot.get_command('jobs').callback(ctx, search_query='python --local')
+        await db.flush_search_history()
+        assert len(await db.get_search_history(1)) == 1
+        await db.close()
+
+    asyncio.run(run())
@@ -0,0 +1,24 @@
+import csv
+import gzip
+from export import BookmarkExport
+from models import Job
+
+
+def test_csv_cells_never_start_a_formula():
+    export = BookmarkExport('csv')
+    try:
+        export.write_chunk([Job(job_id='1', job_title='=HYPERLINK("http://evil")', employer_name='@Acme',
+                                job_description='-1+2', job_city='+London', job_min_salary=50000)])
+        export.close()
+        with gzip.open(export.path, 'rt', encoding='utf-8', newline='') as handle:
+            header, row = list(csv.reader(handle))
+    finally:
+        export.discard()
+
+    cells = dict(zip(header, row))
+    assert cells['job_title'] == '\'=HYPERLINK("http://evil")'
+    assert cells['employer_name'] == "'@Acme"
+    assert cells['job_description'] == "'-1+2"
+    assert cells['job_city'] == "'+London"
+    assert cells['job_min_salary'] == '50000'
+    assert cells['job_id'] == '1'
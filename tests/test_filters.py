@@ -0,0 +1,22 @@
+from commands import parse_job_command
+from filters import compile_filter
+from models import Job
+
+
+def make_job(title: str, description: str = '') -> Job:
+    return Job(job_id='1', job_title=title, employer_name='Acme', job_description=description)
+
+
+def test_exclude_matches_terms_with_symbols():
+    accept = compile_filter(parse_job_command('engineer --exclude c++,c#,.net').filters)
+    assert not accept(make_job('Senior C++ engineer'))
+    assert not accept(make_job('C# developer'))
+    assert not accept(make_job('Backend role', 'Our stack is ASP .NET and SQL'))
+    assert accept(make_job('Python engineer', 'Django and Postgres'))
+
+
+def test_exclude_matches_whole_words_only():
+    accept = compile_filter(parse_job_command('engineer --exclude senior,c').filters)
+    assert not accept(make_job('Senior engineer'))
+    assert accept(make_job('Seniority-free engineer'))
+    assert not accept(make_job('C engineer'))
@@ -0,0 +1,61 @@
+import asyncio
+from types import SimpleNamespace
+import components
+from components import JobNavigationView
+from database import DatabaseManager
+from models import Job
+
+
+class CountingDatabase(DatabaseManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.job_reads = 0
+
+    async def get_result_job(self, set_id: int, position: int, step: int = 0):
+        self.job_reads += 1
+        return await super().get_result_job(set_id, position, step)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.embeds = []
+
+    async def edit_message(self, embed=None, view=None):
+        self.embeds.append(embed)
+
+
+def make_interaction(db):
+    return SimpleNamespace(client=SimpleNamespace(db=db), message=None, response=FakeResponse())
+
+
+async def settle():
+    while components.prerender_tasks:
+        await asyncio.gather(*components.prerender_tasks)
+
+
+def test_clicks_on_prerendered_jobs_skip_the_database(tmp_path):
+    async def run():
+        db = CountingDatabase(str(tmp_path / 'bot.db'))
+        jobs = [Job(job_id=str(i), job_title=f"Job {i}", employer_name='Acme') for i in range(4)]
+        set_id = await db.create_result_set(1, jobs)
+        JobNavigationView(set_id, jobs[0], 0, len(jobs)).create_embed()
+
+        interaction = make_interaction(db)
+        await JobNavigationView.dispatch(interaction, 'next', 0, set_id, 0, False)
+        assert db.job_reads == 1
+        await settle()
+
+        #the jobs either side of the one shown were rendered after the first click
+        reads = db.job_reads
+        await JobNavigationView.dispatch(interaction, 'next', 0, set_id, 1, False)
+        await JobNavigationView.dispatch(interaction, 'prev', 0, set_id, 1, False)
+        assert db.job_reads == reads
+
+        titles = [embed.title for embed in interaction.response.embeds]
+        footers = [embed.footer.text for embed in interaction.response.embeds]
+        assert titles == ['Job 1', 'Job 2', 'Job 0']
+        assert footers[-1] == 'Job 1 of 4'
+        await settle()
+        await db.close()
+
+    asyncio.run(run())
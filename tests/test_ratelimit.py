@@ -0,0 +1,66 @@
+import asyncio
+import time
+import pytest
+from aiohttp import web
+from cache import TTLCache
+from components import RapidAPIJobScraper
+from models import Job
+from ratelimit import RateLimitExceeded, RequestScheduler, retry_delay
+
+
+def test_long_retry_after_is_not_capped():
+    assert retry_delay('3600', 0) >= 3600
+    assert retry_delay('inf', 0) <= 60
+    assert retry_delay(None, 10) <= 60
+
+
+def test_long_backoff_fails_waiters_and_new_requests():
+    async def run():
+        scheduler = RequestScheduler(rate=1, burst=1, max_wait=60)
+        await scheduler.acquire()
+        waiter = asyncio.ensure_future(scheduler.acquire())
+        await asyncio.sleep(0)
+
+        scheduler.backoff(3600)
+        with pytest.raises(RateLimitExceeded):
+            await waiter
+        with pytest.raises(RateLimitExceeded):
+            await scheduler.acquire()
+
+    asyncio.run(run())
+
+
+def test_exhausted_quota_serves_the_stale_page_at_once():
+    async def run():
+        calls = 0
+
+        async def search(_request):
+            nonlocal calls
+            calls += 1
+            return web.Response(status=429, headers={'Retry-After': '3600'})
+
+        app = web.Application()
+        app.router.add_get('/search', search)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        cache = TTLCache(stale_ttl=3600)
+        scraper = RapidAPIJobScraper('key', base_url=f"http://127.0.0.1:{port}", cache=cache)
+        key = scraper._cache_key('python', '', False, 'all') + (1,)
+        cache.set(key, [Job(job_id='a', job_title='Python developer', employer_name='Acme')], 100, -1)
+
+        for _ in range(2):
+            started = time.monotonic()
+            jobs = await scraper.search_jobs('python')
+            assert [job.job_id for job in jobs] == ['a']
+            assert time.monotonic() - started < 5
+
+        #the second search fails fast without asking the API again
+        assert calls == 1
+        await scraper.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
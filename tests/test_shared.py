@@ -0,0 +1,74 @@
+import asyncio
+import json
+import sqlite3
+import time
+from commands import parse_job_command
+from components import RapidAPIJobScraper
+from models import Job
+from shared import SharedStore
+
+
+def test_shared_page_keeps_its_remaining_ttl(tmp_path):
+    async def run():
+        store = SharedStore(str(tmp_path / 'shared.db'))
+        scraper = RapidAPIJobScraper('key', shared_store=store)
+        key = ('python', '', False, 'all', 1)
+        jobs = [Job(job_id='a', job_title='Python developer', employer_name='Acme')]
+
+        #another process cached the page with two seconds left
+        await store.set_page(key, jobs, 2)
+        cached_jobs, expires_at = await store.get_page(key)
+        assert [job.job_id for job in cached_jobs] == ['a']
+        assert 0 < expires_at - time.time() <= 2
+
+        loaded = await scraper._load_page(key, 0)
+        assert [job.job_id for job in loaded] == ['a']
+        local_expires_at = scraper.cache._entries[key][0]
+        assert local_expires_at - time.monotonic() <= 2
+
+        await scraper.close()
+        await store.close()
+
+    asyncio.run(run())
+
+
+def test_warm_counts_only_pages_it_cached(tmp_path):
+    async def run():
+        store = SharedStore(str(tmp_path / 'shared.db'))
+        scraper = RapidAPIJobScraper('key', shared_store=store)
+        cached_query = parse_job_command('python developer')
+        missing_query = parse_job_command('rust developer')
+        key = scraper._cache_key(cached_query.query, cached_query.location, cached_query.remote_only,
+                                 cached_query.date_posted) + (1,)
+        await store.set_page(key, [Job(job_id='a', job_title='Python developer', employer_name='Acme')], 60)
+
+        assert await scraper.warm([cached_query, missing_query]) == 1
+        assert scraper.cache.peek(key) is not None
+
+        await scraper.close()
+        await store.close()
+
+    asyncio.run(run())
+
+
+def test_page_lookups_do_not_wait_for_the_write_lock(tmp_path):
+    async def run():
+        store = SharedStore(str(tmp_path / 'shared.db'))
+        key = ('python', '', False, 'all', 1)
+        await store.set_page(key, [Job(job_id='a', job_title='Python developer', employer_name='Acme')], 60)
+
+        #another process is in the middle of a write
+        other = sqlite3.connect(store.path, isolation_level=None)
+        other.execute('BEGIN IMMEDIATE')
+        try:
+            started = time.monotonic()
+            jobs, _expires_at = await store.get_page(key)
+            assert await store._read(store._lease_released, json.dumps(key), time.time())
+            assert time.monotonic() - started < 1
+            assert [job.job_id for job in jobs] == ['a']
+        finally:
+            other.execute('ROLLBACK')
+            other.close()
+        await store.close()
+
+    asyncio.run(run())